@@ -1,40 +1,55 @@
-import ctypes
 import time
+STARTED_AT = time.perf_counter()
+
+import ctypes
+import json
 import speech_recognition as sr
 import os
-import keyboard
+from urllib.parse import quote_plus
+
+# SLOW OR PLATFORM SPECIFIC HELPERS: imported on first use (see helpers/lazy.py)
+from helpers.lazy import LazyModule
+import helpers.lazy as lazy
+keyboard = LazyModule("keyboard")
+mistral = LazyModule("helpers.mistral")
+avatar = LazyModule("helpers.avatar")
+win32 = LazyModule("helpers.win32")
+spotify = LazyModule("helpers.spotify")
 
-import helpers.mistral as mistral
-import helpers.avatar as avatar
-import helpers.win32 as win32
-import helpers.spotify as spotify
+from helpers.matcher import CommandMatcher
+from helpers.processes import App, ProcessManager, app_commands
+import helpers.events as events
+from helpers.dispatch import Dispatcher
+import helpers.recognition as recognition
+import helpers.streaming as streaming
+from helpers.vad import VoiceActivityGate
+import helpers.tracing as tracing
 
 
+# APPLICATIONS: "open X" / "close X" commands are generated for each entry
+APPS = {
+    "chrome": App(launch=["chrome"], image="chrome.exe"),
+    "notepad": App(launch=["notepad"], image="notepad.exe"),
+    "code": App(launch=["code"], image="Code.exe"),
+    "habitica": App(url="https://habitica.com"),
+    "spotify": App(launch=["spotify"], image="Spotify.exe"),
+    "discord": App(launch=["discord"], image="Discord.exe"),
+    "steam": App(launch=["steam"], image="Steam.exe"),
+}
+PROCESSES = ProcessManager(APPS)  # Launches without a shell and closes without taskkill, see helpers/processes.py
+
 # DEFINE COMMANDS HERE
 COMMANDS = {
     ("hate", "game"): lambda command: keyboard.send('alt+f4'),
     ("clip", "that"): lambda command: print("Making a clip..."),
     
     # WINDOWS
-    ("lock", "pc"): lambda command: os.system("rundll32.exe user32.dll,LockWorkStation"),
-    ("shut", "down", "pc"): lambda command: os.system("shutdown /s /t 1"),
-    ("restart", "pc"): lambda command: os.system("shutdown /r /t 1"),
+    ("lock", "pc"): lambda command: PROCESSES.lock_pc(),
+    ("shut", "down", "pc"): lambda command: PROCESSES.shutdown(),
+    ("restart", "pc"): lambda command: PROCESSES.shutdown(restart=True),
     
     # OPEN/CLOSE COMMANDS
-    ("open", "chrome"): lambda command: os.system("start chrome"),
-    ("close", "chrome"): lambda command: os.system("taskkill /f /im chrome.exe"),
-    ("open", "notepad"): lambda command: os.system("notepad"),
-    ("close", "notepad"): lambda command: os.system("taskkill /f /im notepad.exe"),
-    ("open", "code"): lambda command: os.system("code"),
-    ("close", "code"): lambda command: os.system("taskkill /f /im Code.exe"),
-    ("open", "habitica"): lambda command: os.system(r'start "" "https://habitica.com"'),
-    ("close", "habitica"): lambda command: print("Habitica is a web app, no process to close."),
-    ("open", "spotify"): lambda command: os.system("start spotify"),
-    ("close", "spotify"): lambda command: os.system("taskkill /f /im Spotify.exe"),
-    ("open", "discord"): lambda command: os.system("start discord"),
-    ("close", "discord"): lambda command: os.system("taskkill /f /im Discord.exe"),
-    ("open", "steam"): lambda command: os.system("start steam"),
-    ("close", "steam"): lambda command: os.system("taskkill /f /im Steam.exe"),
+    **app_commands(PROCESSES),
     
     # GOTOs (A bit buggy if using with Komorebic)
     ("go", "to", "chrome"): lambda command: win32.make_window_active("Google Chrome"),
@@ -45,7 +60,7 @@ COMMANDS = {
     ("go", "to", "steam"): lambda command: win32.make_window_active("Steam"),
     
     # GOOGLE CHROME
-    ("google",): lambda command: os.system(rf'start "" "https://www.google.com/search?q={command}"') if not command == "google" and command.startswith("google") else None,
+    ("google",): lambda command: PROCESSES.open_url(f"https://www.google.com/search?q={quote_plus(command)}") if not command == "google" and command.startswith("google") else None,
 
     # SPOTIFY 
     ("play", "music"): lambda command: spotify.play_pause(),
@@ -69,68 +84,160 @@ COMMANDS = {
     # MISTRAL
     ("question",): lambda command: mistral.call_mistral_with_question(command), 
     ("open", "chat"): lambda command: mistral.call_mistral_with_question(command), 
+
+    # DIAGNOSTICS
+    ("action", "stats"): lambda command: DISPATCHER.print_stats(),
+    ("latency", "stats"): lambda command: tracing.TRACER.print_summary(),
+    ("voice", "stats"): lambda command: print(f"Voice activity: {VAD.stats()}"),
+    ("import", "stats"): lambda command: lazy.print_import_report(),
+    ("player", "stats"): lambda command: print(f"Spotify player mirror: {spotify.player_stats()}"),
 }
 
-COMMAND = "" 
+# DISPATCH CATEGORIES: commands in the same category run one at a time, in order
+CATEGORIES = [
+    ("window", {"go"}),
+    ("mistral", {"question", "chat"}),
+    ("system", {"open", "close", "lock", "shut", "restart"}),
+    ("spotify", {"spotify", "music", "song", "volume", "play", "pause", "q"}),
+]
+
+def command_category(keywords):
+    for category, triggers in CATEGORIES:
+        if triggers.intersection(keywords):
+            return category
+    return "default"
+
+DISPATCHER = Dispatcher(max_backlog=8, drop_policy="oldest", timeout=30.0, timeouts={"window": 5.0, "spotify": 15.0})
+
+MATCHER = CommandMatcher(COMMANDS)  # Most specific match wins, see helpers/matcher.py
+
+WARM_UP = os.getenv("GARMIN_WARM_UP", "1") == "1"  # Import the lazy helpers in the background once listening
+
+AVATAR_DECAY = 5.0  # Seconds without speech before the avatar returns to idle (None to never decay)
+
+def run_traced(func, command):
+    tracing.mark("action_started")
+    try:
+        func(command)
+    finally:
+        tracing.mark("action_finished")
+        tracing.finish_trace()
 
 def action(command):
-    global COMMAND
-    COMMAND = command  # Store command globally for main loop
-    for keywords, func in COMMANDS.items():
-        command_words = command.split()
-        contains_all = all((word in command_words for word in keywords))
-        if contains_all:
-            print(f"Executing command: {keywords}")
-            func(command)
-            return
+    match = MATCHER.match(command)
+    if match:
+        keywords, func = match
+        tracing.mark("command_matched")
+        trace = tracing.current_trace()
+        if trace:
+            trace.command = " ".join(keywords)
+        events.publish_command(keywords, command)
+        print(f"Executing command: {keywords}")
+        DISPATCHER.submit(command_category(keywords), keywords, run_traced, func, command)
+    else:
+        tracing.finish_trace()
     return
 
+# RECOGNITION BACKEND: set GARMIN_RECOGNIZER=google|vosk|hybrid (and VOSK_MODEL_PATH) in .env
+RECOGNIZER_BACKEND = recognition.make_backend(COMMANDS)
+
+VAD = VoiceActivityGate()  # Drops clicks, hum and other non-speech before recognition
+
+def handle_command(command, trace=None):
+    if trace is None:  # Streaming partials have no phrase boundaries to start one earlier
+        trace = tracing.start_trace()
+        trace.mark("recognition_returned")
+    trace.text = command
+    events.publish_utterance(command)
+    print(command)
+    action(command)
+
 def callback(recognizer, audio):
-    global COMMAND
+    trace = tracing.start_trace()
+    trace.mark("phrase_end")
+    trace.mark("audio_captured", trace.marks["phrase_end"] - len(audio.frame_data) / (audio.sample_rate * audio.sample_width))
+    if not VAD.is_speech(audio):
+        tracing.discard_trace()
+        return
     try:
-        command = recognizer.recognize_google(audio).lower()
-        COMMAND = command  # Update global command
-        print(COMMAND)
-        action(command)
+        with tracing.span("recognition." + RECOGNIZER_BACKEND.name):
+            command = RECOGNIZER_BACKEND.recognize(recognizer, audio).lower()
+        tracing.mark("recognition_returned")
+        VAD.mark_recognized()
+        handle_command(command, trace)
     except sr.UnknownValueError:
-        pass
+        tracing.discard_trace()
     except sr.RequestError as e:
-        pass
+        tracing.discard_trace()
+        print(f"Recognition request failed: {e}")
+
+def streaming_final(text, audio):
+    # Each final transcript is its own utterance, even if an earlier one is still running
+    trace = tracing.start_trace()
+    trace.mark("phrase_end")
+    trace.mark("audio_captured", trace.marks["phrase_end"] - len(audio) / (recognition.SAMPLE_RATE * 2))
+    # The offline grammar can't transcribe free text, so send that utterance to the cloud
+    if recognition.needs_free_text(text):
+        try:
+            with tracing.span("recognition.google"):
+                text = recognition.GoogleBackend().recognize(r, sr.AudioData(audio, recognition.SAMPLE_RATE, 2)).lower()
+        except sr.UnknownValueError:
+            tracing.discard_trace()
+            return
+        except sr.RequestError as e:
+            tracing.discard_trace()
+            print(f"Recognition request failed: {e}")
+            return
+    trace.mark("recognition_returned")
+    handle_command(text, trace)
+
+# STREAMING MODE: set GARMIN_STREAMING=1 with a vosk or hybrid recognizer to run short commands from partial transcripts
+LOCAL_MODEL = getattr(getattr(RECOGNIZER_BACKEND, "local", RECOGNIZER_BACKEND), "model", None)
+STREAMING = os.getenv("GARMIN_STREAMING") == "1" and LOCAL_MODEL is not None
 
 # INITIALIZE RECOGNITION
 r = sr.Recognizer()
-m = sr.Microphone()
 
 r.pause_threshold = .5                      # How long to wait before considering speech ended
 r.phrase_threshold = .1                     # Minimum audio length to consider as speech
 r.non_speaking_duration = .5                # Minimum silence duration to split phrases
 
-with m as source: r.adjust_for_ambient_noise(source)
-r.listen_in_background(m, callback)
-
-# MAIN LOOP to UPDATE AVATAR ANIMATION AND RESPOND TO COMMANDS
-last_animation = None
-while True:
-    if any(word in COMMAND for word in ["what", "who", "where", "when", "why", "how"]):
-        if last_animation != "thinking":
-            avatar.start_gui_thread("thinking")
-            last_animation = "thinking"
-    elif "open" in COMMAND or "close" in COMMAND:
-        if last_animation != "active":
-            avatar.start_gui_thread("active")
-            last_animation = "active"
-    elif "thanks" in COMMAND:
-        if last_animation != "happy":
-            avatar.start_gui_thread("happy")
-            last_animation = "happy"
-    elif any(word in COMMAND for word in ["hate", "close"]):
-        if last_animation != "angry":
-            avatar.start_gui_thread("angry")
-            last_animation = "angry"
+# TUNED SETTINGS: `python optimize.py --corpus DIR` writes this profile, which overrides the defaults above
+PROFILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "garmin_profile.json")
+
+def load_profile(recognizer, path=PROFILE_PATH):
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            profile = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable profile {path}: {e}")
+        return
+    for name in ("pause_threshold", "phrase_threshold", "non_speaking_duration"):
+        if name in profile:
+            setattr(recognizer, name, float(profile[name]))
+    print(f"Loaded recognizer profile from {path}")
+
+load_profile(r)
+
+def main():
+    if STREAMING:
+        m = sr.Microphone(sample_rate=recognition.SAMPLE_RATE)
+        listener = streaming.StreamingCommandListener(LOCAL_MODEL, COMMANDS, MATCHER, handle_command, streaming_final)
+        streaming.listen_in_background(m, listener)
     else:
-        if last_animation != "idle":
-            avatar.start_gui_thread("idle")
-            last_animation = "idle"
+        m = sr.Microphone()
+        with m as source: r.adjust_for_ambient_noise(source)
+        VAD.calibrate(r.energy_threshold, r.dynamic_energy_ratio)
+        r.listen_in_background(m, callback)
+    print(f"Listening {(time.perf_counter() - STARTED_AT) * 1000:.0f} ms after start")
+
+    if WARM_UP:
+        lazy.warm_up([spotify, mistral, win32, keyboard])
+
+    # MAIN LOOP: UPDATE AVATAR ANIMATION AS EVENTS ARRIVE
+    events.AvatarStateMachine(avatar.start_gui_thread, decay=AVATAR_DECAY).run()
 
-    time.sleep(1) 
-    
\ No newline at end of file
+if __name__ == "__main__":
+    main()
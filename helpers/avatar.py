@@ -1,55 +1,197 @@
 import tkinter as tk
 import threading
 import os
+import queue
+import time
+from collections import OrderedDict, deque
+
+# Window dimensions
+WINDOW_WIDTH = 50
+WINDOW_HEIGHT = 75
+
+def load_frames(gif_path):
+    """Decode every frame of a GIF, probing indices until Tk runs out."""
+    frames = []
+    try:
+        frame = 0
+        while True:
+            frames.append(tk.PhotoImage(file=gif_path, format=f"gif -index {frame}"))
+            frame += 1
+    except tk.TclError:
+        # No more frames
+        pass
+    return frames
+
+def gif_frame_delays(gif_path, default=100):
+    """Read each frame's delay in milliseconds from the GIF's graphic control blocks."""
+    with open(gif_path, "rb") as f:
+        data = f.read()
+    delays = []
+    pending = default
+
+    def skip_sub_blocks(i):
+        while i < len(data) and data[i]:
+            i += data[i] + 1
+        return i + 1
+
+    i = 13  # Header and logical screen descriptor
+    if data[10] & 0x80:
+        i += 3 * (2 ** ((data[10] & 0x07) + 1))  # Global color table
+    while i < len(data):
+        block = data[i]
+        if block == 0x21:  # Extension
+            if data[i + 1] == 0xF9 and i + 6 < len(data):
+                delay = int.from_bytes(data[i + 4:i + 6], "little") * 10
+                pending = delay if delay >= 20 else default  # Browsers treat tiny delays as 100ms too
+            i = skip_sub_blocks(i + 2)
+        elif block == 0x2C:  # Image descriptor
+            packed = data[i + 9]
+            i += 10
+            if packed & 0x80:
+                i += 3 * (2 ** ((packed & 0x07) + 1))  # Local color table
+            i = skip_sub_blocks(i + 1)  # LZW minimum code size, then image data
+            delays.append(pending)
+            pending = default
+        else:  # Trailer or garbage
+            break
+    return delays
+
+def scale_to_window(image):
+    """Shrink or grow a frame by whole factors so it fits the avatar window."""
+    width, height = image.width(), image.height()
+    if width > WINDOW_WIDTH or height > WINDOW_HEIGHT:
+        factor = max(-(-width // WINDOW_WIDTH), -(-height // WINDOW_HEIGHT))
+        return image.subsample(factor, factor)
+    factor = min(WINDOW_WIDTH // max(width, 1), WINDOW_HEIGHT // max(height, 1))
+    if factor > 1:
+        return image.zoom(factor, factor)
+    return image
+
+class FrameCache:
+    """Decoded, pre-scaled frames per GIF so switching states doesn't decode again.
+
+    States are decoded on first use (or by preload) on the Tk thread. States
+    not used for `idle_ttl` seconds are dropped, and at most `max_states` are
+    kept at once.
+    """
+
+    def __init__(self, max_states=5, idle_ttl=600):
+        self.max_states = max_states
+        self.idle_ttl = idle_ttl
+        self.frames = OrderedDict()  # gif path -> ([PhotoImage], [delay ms])
+        self.last_used = {}
+
+    def get(self, gif_path):
+        """Return (frames, delays) for a GIF; both empty if it can't be loaded."""
+        now = time.monotonic()
+        entry = self.frames.get(gif_path)
+        if entry is None:
+            entry = self.load(gif_path)
+            if not entry[0]:
+                return entry
+        self.frames.move_to_end(gif_path)
+        self.last_used[gif_path] = now
+        self.prune(now, keep=gif_path)
+        return entry
+
+    def load(self, gif_path):
+        frames = [scale_to_window(image) for image in load_frames(gif_path)]
+        if not frames:
+            return [], []
+        try:
+            delays = gif_frame_delays(gif_path)
+        except (OSError, IndexError) as e:
+            print(f"Couldn't read frame delays from {gif_path}: {e}")
+            delays = []
+        delays = (delays + [100] * len(frames))[:len(frames)]
+        self.frames[gif_path] = (frames, delays)
+        self.last_used[gif_path] = time.monotonic()
+        return frames, delays
+
+    def preload(self, gif_path):
+        # Preloaded states count as least recently used until actually shown
+        if gif_path not in self.frames and self.load(gif_path)[0]:
+            self.frames.move_to_end(gif_path, last=False)
+
+    def prune(self, now, keep=None):
+        for path in list(self.frames):
+            if path == keep:
+                continue
+            if len(self.frames) > self.max_states or now - self.last_used[path] > self.idle_ttl:
+                del self.frames[path]
+                del self.last_used[path]
+
+    def clear(self):
+        self.frames.clear()
+        self.last_used.clear()
+
+frame_cache = FrameCache()
 
 class AnimatedGIF:
     def __init__(self, root, gif_path):
         self.root = root
         self.gif_path = gif_path
-        self.frames = []
+        self.frames, self.delays = frame_cache.get(gif_path)
         self.current_frame = 0
         self.animating = False
-        
-        # Load all frames of the GIF
-        try:
-            frame = 0
-            while True:
-                self.frames.append(tk.PhotoImage(file=gif_path, format=f"gif -index {frame}"))
-                frame += 1
-        except tk.TclError:
-            # No more frames
-            pass
+        self.after_id = None
         
         self.label = tk.Label(root, bg='black', borderwidth=0, highlightthickness=0)
         self.label.pack()
         
+        # Only tick while the window is on screen
+        root.bind("<Map>", lambda event: self.start_animation(), add="+")
+        root.bind("<Unmap>", lambda event: self.stop_animation(), add="+")
+        
         if self.frames:
             self.start_animation()
     
+    def set_frames(self, frames, delays):
+        self.stop_animation()
+        self.frames = frames
+        self.delays = delays
+        self.current_frame = 0
+        self.start_animation()
+    
     def start_animation(self):
-        if not self.animating:
+        if not self.animating and self.frames:
             self.animating = True
             self.animate()
     
     def stop_animation(self):
         self.animating = False
+        if self.after_id:
+            try:
+                self.root.after_cancel(self.after_id)
+            except tk.TclError:
+                pass
+            self.after_id = None
     
     def animate(self):
+        self.after_id = None
         if self.animating and self.frames:
             try:
                 self.label.config(image=self.frames[self.current_frame])
+                if len(self.frames) == 1:
+                    # Static image, nothing left to tick until the frames change
+                    self.animating = False
+                    return
+                delay = self.delays[self.current_frame]
                 self.current_frame = (self.current_frame + 1) % len(self.frames)
-                self.root.after(100, self.animate)  # 100ms delay between frames
+                self.after_id = self.root.after(delay, self.animate)  # Each frame's own delay
             except tk.TclError:
                 # Handle case where tkinter has been destroyed
                 self.animating = False
 
+AVATAR_STATES = ["idle", "thinking", "active", "happy", "angry"]
+
 # Global variables for tkinter GUI
 root = None
 animated_gif = None
 gui_thread = None
 current_gif_name = None
-requested_gif_name = None
+gif_requests = queue.Queue()  # GIF names waiting to be shown, drained on the Tk thread
+switch_times = deque(maxlen=100)  # (gif name, milliseconds spent switching)
 
 def cleanup_gui():
     """Clean up the existing GUI thread and window"""
@@ -60,6 +202,7 @@ def cleanup_gui():
             if animated_gif:
                 animated_gif.stop_animation()
             # Schedule destruction on the GUI thread using after()
+            root.after(0, frame_cache.clear)  # Cached images belong to this Tk instance
             root.after(0, lambda: root.quit())
             # Don't call destroy() from different thread
             root = None
@@ -74,30 +217,26 @@ def change_gif(new_gif_name):
     if root and animated_gif and current_gif_name != new_gif_name:
         try:
             gif_path = os.path.join(os.path.dirname(__file__), new_gif_name)
-            new_frames = []
-            frame = 0
-            while True:
-                try:
-                    new_frames.append(tk.PhotoImage(file=gif_path, format=f"gif -index {frame}"))
-                    frame += 1
-                except tk.TclError:
-                    break
+            start = time.perf_counter()
+            new_frames, delays = frame_cache.get(gif_path)
             
             if new_frames:
-                animated_gif.frames = new_frames
-                animated_gif.current_frame = 0
+                animated_gif.set_frames(new_frames, delays)
                 current_gif_name = new_gif_name
+                switch_times.append((new_gif_name, (time.perf_counter() - start) * 1000))
         except Exception as e:
             print(f"Error changing GIF: {e}")
 
-def check_for_gif_change():
-    global requested_gif_name, current_gif_name
-    if requested_gif_name and requested_gif_name != current_gif_name:
-        change_gif(requested_gif_name)
-        requested_gif_name = None
-    
-    if root:
-        root.after(100, check_for_gif_change)
+def drain_gif_requests(event=None):
+    """Show the latest requested GIF; runs on the Tk thread when woken up."""
+    latest = None
+    while True:
+        try:
+            latest = gif_requests.get_nowait()
+        except queue.Empty:
+            break
+    if latest and latest != current_gif_name:
+        change_gif(latest)
 
 def setup_gui(file_name):
     global root, animated_gif, current_gif_name
@@ -117,31 +256,33 @@ def setup_gui(file_name):
     screen_width = root.winfo_screenwidth()
     screen_height = root.winfo_screenheight()
     
-    # Window dimensions
-    window_width = 50
-    window_height = 75
-    
     # Calculate position for bottom right corner with small margin
-    x_offset = screen_width - window_width - 20
-    y_offset = screen_height - window_height 
+    x_offset = screen_width - WINDOW_WIDTH - 20
+    y_offset = screen_height - WINDOW_HEIGHT 
     
-    root.geometry(f"{window_width}x{window_height}+{x_offset}+{y_offset}")
+    root.geometry(f"{WINDOW_WIDTH}x{WINDOW_HEIGHT}+{x_offset}+{y_offset}")
     gif_path = os.path.join(os.path.dirname(__file__), f"gifs/{file_name}.gif")
     
     animated_gif = AnimatedGIF(root, gif_path)
     current_gif_name = f"gifs/{file_name}.gif"
 
-    check_for_gif_change()
+    # Decode the other states once the window is up, one per idle slot
+    for state in AVATAR_STATES:
+        root.after_idle(frame_cache.preload, os.path.join(os.path.dirname(__file__), f"gifs/{state}.gif"))
+
+    # Other threads wake the Tk thread with this event instead of it polling
+    root.bind("<<GifChange>>", drain_gif_requests)
+    drain_gif_requests()
     
     root.mainloop()
 
 def start_gui_thread(file_name="gengar"):
-    global gui_thread, requested_gif_name
+    global gui_thread
     
     # If GUI is already running, just request a GIF change
     try:
         if root and root.winfo_exists():
-            requested_gif_name = f"gifs/{file_name}.gif"
+            request_gif_change(file_name)
             return gui_thread
     except tk.TclError:
         # Window was destroyed, need to start new one
@@ -154,8 +295,13 @@ def start_gui_thread(file_name="gengar"):
     return gui_thread
 
 def request_gif_change(file_name):
-    global requested_gif_name
-    requested_gif_name = f"gifs/{file_name}.gif"
+    gif_requests.put(f"gifs/{file_name}.gif")
+    try:
+        if root:
+            root.event_generate("<<GifChange>>", when="tail")
+    except (tk.TclError, RuntimeError):
+        # GUI not ready yet, setup_gui drains the queue once it is
+        pass
 
 def stop_avatar():
     cleanup_gui()
@@ -165,4 +311,37 @@ def is_avatar_running():
     try:
         return root is not None and root.winfo_exists()
     except (tk.TclError, AttributeError):
-        return False
\ No newline at end of file
+        return False
+
+def measure_switch_latency(rounds=3):
+    """Compare switching states by decoding every time against the frame cache."""
+    gifs_dir = os.path.join(os.path.dirname(__file__), "gifs")
+    paths = [os.path.join(gifs_dir, f"{state}.gif") for state in AVATAR_STATES]
+    paths = [path for path in paths if os.path.exists(path)]
+    if not paths:
+        print(f"No avatar GIFs found in {gifs_dir}")
+        return
+    window = tk.Tk()
+    window.withdraw()
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for path in paths:
+            [scale_to_window(image) for image in load_frames(path)]
+    uncached = (time.perf_counter() - start) / (rounds * len(paths)) * 1000
+
+    cache = FrameCache()
+    for path in paths:
+        cache.preload(path)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for path in paths:
+            cache.get(path)
+    cached = (time.perf_counter() - start) / (rounds * len(paths)) * 1000
+
+    window.destroy()
+    print(f"Switch latency decoding every time: {uncached:.2f} ms")
+    print(f"Switch latency with frame cache:    {cached:.3f} ms")
+
+if __name__ == "__main__":
+    measure_switch_latency()
@@ -0,0 +1,157 @@
+import atexit
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Words speech recognition spells more than one way, mapped to one spelling
+ASR_VARIANTS = {
+    "&": "and",
+    "n": "and",
+    "little": "lil",
+    "mister": "mr",
+    "doctor": "dr",
+    "featuring": "feat",
+    "ft": "feat",
+}
+
+def normalize_query(text):
+    """Lowercase, drop punctuation and collapse whitespace and ASR spelling variants."""
+    text = text.lower().replace("&", " & ")
+    words = re.sub(r"[^\w\s&]", "", text).split()
+    return " ".join(ASR_VARIANTS.get(word, word) for word in words)
+
+class LRUCache:
+    """Bounded cache with per-entry TTL and least-recently-used eviction.
+
+    If `path` is given, entries are loaded from and written back to a JSON file
+    so a restart starts warm. Values must be JSON serializable. Changes are
+    written at most every `flush_delay` seconds on a timer thread, and once
+    more at exit, so lookups never wait on the disk.
+    """
+
+    def __init__(self, maxsize=256, ttl=3600, path=None, flush_delay=5.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.flush_delay = flush_delay
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()  # One writer at a time, without holding up lookups
+        self.dirty = False
+        self.flush_timer = None
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.load()
+        if path:
+            atexit.register(self.flush)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.entries[key] = (time.time() + (ttl if ttl is not None else self.ttl), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self.mark_dirty()
+
+    def delete(self, key):
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self.mark_dirty()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.mark_dirty()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable cache file {self.path}: {e}")
+            return
+        now = time.time()
+        try:
+            for key, expires_at, value in stored:
+                if float(expires_at) > now:
+                    self.entries[key] = (float(expires_at), value)
+        except (TypeError, ValueError) as e:  # Valid JSON, but not a list of [key, expires_at, value]
+            print(f"Ignoring malformed cache file {self.path}: {e}")
+            self.entries.clear()
+            return
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def mark_dirty(self):
+        # Called with the lock held
+        if not self.path:
+            return
+        self.dirty = True
+        if self.flush_timer is None:
+            self.flush_timer = threading.Timer(self.flush_delay, self.flush)
+            self.flush_timer.daemon = True
+            self.flush_timer.start()
+
+    def flush(self):
+        """Write pending changes to the file now."""
+        with self.write_lock:
+            with self.lock:
+                if self.flush_timer:
+                    self.flush_timer.cancel()
+                    self.flush_timer = None
+                if not self.dirty:
+                    return
+                self.dirty = False
+                snapshot = [[key, expires_at, value] for key, (expires_at, value) in self.entries.items()]
+            if not self.save(snapshot):
+                with self.lock:
+                    self.dirty = True  # Try again with the next change or at exit
+
+    def save(self, snapshot):
+        # Write then rename so a crash never leaves half a file
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(temp_path, self.path)
+            return True
+        except OSError as e:
+            print(f"Failed to write cache file {self.path}: {e}")
+            return False
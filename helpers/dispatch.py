@@ -0,0 +1,112 @@
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+class Dispatcher:
+    """Runs matched commands off the recognizer thread.
+
+    Each category gets its own lane: actions in the same lane run one after
+    another in submission order (all Spotify calls, all window switches), while
+    different lanes run in parallel on a shared worker pool. A lane holds at
+    most `max_backlog` pending actions; when full, drop_policy "oldest" discards
+    the oldest pending action and "newest" rejects the incoming one.
+
+    Actions run in a copy of the submitter's contextvars context, so per
+    utterance state like the current trace follows them onto the pool.
+
+    An action that runs past its timeout is reported and its lane moves on. If
+    it never got a pool thread it is cancelled; one that already started can't
+    be killed, so it keeps its thread until it returns and may finish after
+    later actions in its lane.
+    """
+
+    def __init__(self, workers=8, max_backlog=8, drop_policy="oldest", timeout=30.0, timeouts=None):
+        if drop_policy not in ("oldest", "newest"):
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="garmin-action")
+        self.max_backlog = max_backlog
+        self.drop_policy = drop_policy
+        self.timeout = timeout
+        self.timeouts = timeouts or {}  # category -> seconds
+        self.condition = threading.Condition()
+        self.lanes = {}                 # category -> deque of pending actions
+        self.lane_threads = {}
+        self.timings = {}               # action name -> timing stats
+        self.dropped = 0
+        self.timed_out = 0
+
+    def submit(self, category, name, func, *args, timeout=None):
+        """Queue func(*args) on the category lane. Returns False if it was dropped."""
+        with self.condition:
+            lane = self.lanes.setdefault(category, deque())
+            if len(lane) >= self.max_backlog:
+                self.dropped += 1
+                if self.drop_policy == "newest":
+                    print(f"Dropped {name}: {category} backlog full")
+                    return False
+                dropped_name = lane.popleft()[0]
+                print(f"Dropped {dropped_name}: {category} backlog full")
+            if timeout is None:
+                timeout = self.timeouts.get(category, self.timeout)
+            lane.append((name, func, args, timeout, time.perf_counter(), contextvars.copy_context()))
+            if category not in self.lane_threads:
+                thread = threading.Thread(target=self._run_lane, args=(category,), daemon=True)
+                self.lane_threads[category] = thread
+                thread.start()
+            self.condition.notify_all()
+        return True
+
+    def _run_lane(self, category):
+        lane = self.lanes[category]
+        while True:
+            with self.condition:
+                while not lane:
+                    self.condition.wait()
+                name, func, args, timeout, queued_at, context = lane.popleft()
+
+            started_at = time.perf_counter()
+            future = self.pool.submit(context.run, func, *args)
+            try:
+                future.result(timeout=timeout)
+            except FutureTimeout:
+                with self.condition:
+                    self.timed_out += 1
+                if future.cancel():
+                    print(f"Action {name} timed out after {timeout}s waiting for a worker, cancelled")
+                else:
+                    print(f"Action {name} timed out after {timeout}s, still running; {category} actions after it may finish first")
+            except Exception as e:
+                print(f"Error executing {name}: {e}")
+            self._record(name, started_at - queued_at, time.perf_counter() - started_at)
+
+    def _record(self, name, wait, elapsed):
+        with self.condition:
+            timing = self.timings.setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0, "wait_ms": 0.0})
+            timing["count"] += 1
+            timing["total_ms"] += elapsed * 1000
+            timing["max_ms"] = max(timing["max_ms"], elapsed * 1000)
+            timing["last_ms"] = elapsed * 1000
+            timing["wait_ms"] += wait * 1000
+
+    def queue_depth(self):
+        with self.condition:
+            return {category: len(lane) for category, lane in self.lanes.items()}
+
+    def stats(self):
+        with self.condition:
+            return {
+                "queue_depth": {category: len(lane) for category, lane in self.lanes.items()},
+                "dropped": self.dropped,
+                "timed_out": self.timed_out,
+                "actions": {name: dict(timing) for name, timing in self.timings.items()},
+            }
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f"Queue depth: {stats['queue_depth']}  dropped: {stats['dropped']}  timed out: {stats['timed_out']}")
+        for name, timing in stats["actions"].items():
+            average = timing["total_ms"] / timing["count"]
+            wait = timing["wait_ms"] / timing["count"]
+            print(f"- {name}: {timing['count']} runs, avg {average:.1f} ms, max {timing['max_ms']:.1f} ms, avg wait {wait:.1f} ms")
@@ -0,0 +1,106 @@
+import queue
+import threading
+import time
+from collections import namedtuple
+
+# EVENT TYPES
+Utterance = namedtuple("Utterance", ["text", "timestamp"])                    # Published by garmin.callback
+CommandMatched = namedtuple("CommandMatched", ["keywords", "text", "timestamp"])  # Published by garmin.action
+
+EVENTS = queue.Queue()
+
+def publish(event):
+    EVENTS.put(event)
+
+def publish_utterance(text):
+    publish(Utterance(text, time.perf_counter()))
+
+def publish_command(keywords, text):
+    publish(CommandMatched(keywords, text, time.perf_counter()))
+
+# AVATAR STATES, checked in order
+AVATAR_RULES = [
+    ("thinking", {"what", "who", "where", "when", "why", "how"}),
+    ("active", {"open", "close"}),
+    ("happy", {"thanks"}),
+    ("angry", {"hate"}),
+]
+
+def avatar_state_for(text):
+    # Prefixes, so "what's", "how's" and "thanks!" still count
+    words = set(text.split())
+    for state, triggers in AVATAR_RULES:
+        if any(word.startswith(trigger) for word in words for trigger in triggers):
+            return state
+    return "idle"
+
+class AvatarStateMachine:
+    """Moves the avatar between states as events arrive.
+
+    Blocks on the event queue instead of polling, so transitions happen as soon
+    as an event is published and the thread sleeps while nothing is said. After
+    `decay` seconds without events the avatar falls back to idle (None keeps the
+    last state until the next event).
+    """
+
+    def __init__(self, show, decay=5.0, events=EVENTS):
+        self.show = show
+        self.decay = decay
+        self.events = events
+        self.state = None
+
+    def transition(self, state):
+        if state != self.state:
+            self.show(state)
+            self.state = state
+
+    def handle(self, event):
+        self.transition(avatar_state_for(event.text))
+
+    def run(self):
+        self.transition("idle")
+        while True:
+            timeout = self.decay if self.state != "idle" else None
+            try:
+                event = self.events.get(timeout=timeout)
+            except queue.Empty:
+                self.transition("idle")
+                continue
+            if event is None:  # Sentinel to stop the loop
+                return
+            self.handle(event)
+
+def measure_latency(samples=200):
+    """Measure event-to-show latency in milliseconds with a stub avatar."""
+    events = queue.Queue()
+    latencies = []
+    published = {}
+    shown = threading.Event()
+
+    def show(state):
+        if state in published:
+            latencies.append((time.perf_counter() - published.pop(state)) * 1000)
+            shown.set()
+
+    machine = AvatarStateMachine(show, decay=None, events=events)
+    thread = threading.Thread(target=machine.run, daemon=True)
+    thread.start()
+
+    utterances = ["what time is it", "open chrome", "thanks garmin", "i hate this game"]
+    for i in range(samples):
+        text = utterances[i % len(utterances)]
+        shown.clear()
+        published[avatar_state_for(text)] = time.perf_counter()
+        events.put(Utterance(text, time.perf_counter()))
+        shown.wait(1)
+    events.put(None)
+    thread.join()
+
+    latencies.sort()
+    print(f"Samples: {len(latencies)}")
+    print(f"Median latency: {latencies[len(latencies) // 2]:.3f} ms")
+    print(f"Max latency: {latencies[-1]:.3f} ms")
+    return latencies
+
+if __name__ == "__main__":
+    measure_latency()
@@ -0,0 +1,143 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+DEFAULT_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_ALL_METHODS = {"GET", "HEAD", "DELETE", "OPTIONS"}  # Safe to send again whatever happened
+
+class HTTPClient:
+    """Shared keep-alive session with bounded retries for the Spotify Web API.
+
+    For GET-like methods, 429 and 5xx responses, connection errors and read
+    timeouts are retried with exponential backoff and jitter, waiting for
+    Retry-After when the server sends one. POST and PUT are only retried when
+    the request provably never ran: a 429, or a failure while connecting.
+    A 502 or dropped connection on POST /me/player/queue may still have queued
+    the track, so those go back to the caller instead of queueing it again.
+    """
+
+    def __init__(self, pool_size=10, retries=3, backoff=0.5, max_backoff=8.0, max_retry_after=30.0, timeout=DEFAULT_TIMEOUT):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.timeout = timeout
+
+    def backoff_delay(self, attempt):
+        delay = min(self.max_backoff, self.backoff * (2 ** attempt))
+        return random.uniform(delay / 2, delay)  # Jitter so parallel callers don't retry in lockstep
+
+    def retry_after(self, response):
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def never_sent(error):
+        """True if the request failed while connecting, so the server never saw it."""
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(reason, NewConnectionError)  # Connection refused, DNS failure...
+
+    def request(self, method, url, timeout=None, **kwargs):
+        method = method.upper()
+        retry_all = method in RETRY_ALL_METHODS
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last_attempt or not (retry_all or self.never_sent(e)):
+                    raise
+                delay = self.backoff_delay(attempt)
+            else:
+                retry = response.status_code == 429 or (retry_all and response.status_code in RETRY_STATUSES)
+                if not retry or last_attempt:
+                    return response
+                delay = self.retry_after(response)
+                if delay is None:
+                    delay = self.backoff_delay(attempt)
+                elif delay > self.max_retry_after:
+                    print(f"Rate limited for {delay:.0f}s, giving up on {method} {url}")
+                    return response
+                print(f"{method} {url} returned {response.status_code}, retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+CLIENT = HTTPClient()
+
+def get(url, **kwargs):
+    return CLIENT.get(url, **kwargs)
+
+def post(url, **kwargs):
+    return CLIENT.post(url, **kwargs)
+
+def put(url, **kwargs):
+    return CLIENT.put(url, **kwargs)
+
+# BENCHMARK AGAINST A LOCAL STUB SERVER
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep connections alive between requests
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def benchmark(n_requests=500):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/search"
+
+    start = time.perf_counter()
+    for _ in range(n_requests):
+        requests.get(url, timeout=DEFAULT_TIMEOUT)
+    unpooled = n_requests / (time.perf_counter() - start)
+
+    client = HTTPClient()
+    start = time.perf_counter()
+    for _ in range(n_requests):
+        client.get(url)
+    pooled = n_requests / (time.perf_counter() - start)
+
+    server.shutdown()
+    print(f"New connection per request: {unpooled:.0f} req/s")
+    print(f"Pooled keep-alive session:  {pooled:.0f} req/s ({pooled / unpooled:.1f}x)")
+
+if __name__ == "__main__":
+    benchmark()
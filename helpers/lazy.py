@@ -0,0 +1,124 @@
+import importlib
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+LOAD_TIMES = {}  # module name -> seconds spent importing it on first use
+
+class LazyModule:
+    """Stands in for a module and imports it the first time an attribute is used.
+
+    garmin.py uses these for helpers that are slow to import or only work on
+    some platforms, so the microphone is listening before they load. Anything
+    already in sys.modules (like replay.py's stubs) is used as is.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    LOAD_TIMES[self._name] = time.perf_counter() - start
+                    self._module = module
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}{'' if self.loaded else ' (not loaded)'}>"
+
+def warm_up(modules, delay=0.0):
+    """Import the given lazy modules in a background thread, so first commands don't pay for it."""
+    def run():
+        time.sleep(delay)
+        for module in modules:
+            try:
+                module._load()
+            except Exception as e:  # ImportError on the wrong platform, missing settings...
+                print(f"Warm-up of {module._name} failed: {e}")
+
+    thread = threading.Thread(target=run, daemon=True, name="garmin-warm-up")
+    thread.start()
+    return thread
+
+def import_report():
+    return {name: seconds * 1000 for name, seconds in sorted(LOAD_TIMES.items(), key=lambda item: -item[1])}
+
+def print_import_report():
+    report = import_report()
+    if not report:
+        print("No lazy modules loaded yet")
+    for name, ms in report.items():
+        print(f"- {name}: {ms:.1f} ms")
+
+# STARTUP BENCHMARK
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def import_costs(statement, cwd=None):
+    """Run statement in a fresh interpreter under -X importtime.
+
+    Returns the wall time in ms and a list of (depth, module, cumulative ms)
+    in import order, where depth 1 is imported directly by the statement.
+    """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            cwd=cwd, capture_output=True, text=True)
+    wall = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    costs = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            costs.append((len(match.group(3)) // 2 + 1, match.group(4), int(match.group(2)) / 1000))
+    return wall, costs
+
+def benchmark(rounds=5, top=8):
+    """Time `import garmin` in fresh interpreters, then what each lazy helper costs on first use."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    statement = "import garmin"
+    if sys.platform != "win32":
+        # keyboard needs root on Linux; the lazy proxy never touches it during import anyway
+        statement = "import sys, types; sys.modules['keyboard'] = types.ModuleType('keyboard'); import garmin"
+
+    walls = []
+    for _ in range(rounds):
+        wall, costs = import_costs(statement, cwd=root)
+        walls.append(wall)
+    walls.sort()
+    garmin_ms = next(ms for depth, name, ms in costs if name == "garmin")
+    print(f"Interpreter start plus import garmin: median {walls[len(walls) // 2]:.0f} ms, import garmin alone {garmin_ms:.0f} ms")
+    # Children are listed before their parent, so garmin's direct imports are the depth 2 lines just above it
+    children = []
+    for depth, name, ms in reversed(costs[:[name for _, name, _ in costs].index("garmin")]):
+        if depth == 1:
+            break
+        if depth == 2:
+            children.append((ms, name))
+    for ms, name in sorted(children, reverse=True)[:top]:
+        print(f"- {name}: {ms:.1f} ms")
+
+    print("Deferred until first use:")
+    for name in ("helpers.spotify", "helpers.mistral", "helpers.avatar", "helpers.win32"):
+        try:
+            _, costs = import_costs(f"import {name}", cwd=root)
+            print(f"- {name}: {sum(ms for depth, _, ms in costs if depth == 1):.1f} ms")
+        except RuntimeError as e:
+            print(f"- {name}: not importable here ({e})")
+
+if __name__ == "__main__":
+    benchmark()
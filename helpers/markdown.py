@@ -0,0 +1,277 @@
+import random
+import re
+import time
+
+# Lines starting with 1-6 hashes and a space are headers
+HEADER = re.compile(r"(#{1,6})[ \t]+")
+HEADER_PREFIX = re.compile(r"#{1,6}")
+# Characters that can start or end a span outside code
+SPECIAL = re.compile(r"[*`\[\n]")
+LINK = re.compile(r"\[([^\]\n]+)\]\(([^)\n]+)\)")
+LINK_PREFIX = re.compile(r"\[[^\]\n]*(\](\([^)\n]*)?)?")
+MAX_LINK = 300  # Longer bracketed text is not held back waiting for a link
+
+class MarkdownTokenizer:
+    """Splits streamed Markdown into tokens, however the stream is chunked.
+
+    feed() takes chunks and returns the tokens they complete: ("text", s),
+    ("open", style), ("close", style) and ("link", (text, url)), with style one
+    of h1-h6, bold, italic, code or fence. Markers that might be cut by a chunk
+    boundary (a lone "*" or "`", a "#" at line start, a link in progress) are
+    held back until the next chunk decides them, so each character is scanned
+    a bounded number of times. Bold, italic and headers close at the end of a
+    line; close() ends the stream and closes whatever is still open.
+    """
+
+    def __init__(self):
+        self.carry = ""        # Unfinished marker from the previous chunk
+        self.open_styles = []
+        self.line_start = True
+
+    def feed(self, chunk):
+        return self._scan(self.carry + chunk, final=False)
+
+    def close(self):
+        tokens = self._scan(self.carry, final=True)
+        while self.open_styles:
+            tokens.append(("close", self.open_styles.pop()))
+        return tokens
+
+    def _close(self, tokens, style):
+        self.open_styles.remove(style)
+        tokens.append(("close", style))
+
+    def _scan(self, text, final):
+        self.carry = ""
+        tokens = []
+        i, n = 0, len(text)
+        while i < n:
+            if "fence" in self.open_styles or "code" in self.open_styles:
+                marker = "```" if "fence" in self.open_styles else "`"
+                j = text.find(marker, i)
+                if j < 0:
+                    # Trailing backticks may be the start of the closing marker
+                    keep = 0 if final else min(len(text) - len(text.rstrip("`")), len(marker) - 1, n - i)
+                    if n - keep > i:
+                        tokens.append(("text", text[i:n - keep]))
+                    self.carry = text[n - keep:]
+                    return tokens
+                if j > i:
+                    tokens.append(("text", text[i:j]))
+                self._close(tokens, "fence" if marker == "```" else "code")
+                i = j + len(marker)
+                continue
+
+            if self.line_start and text[i] == "#":
+                match = HEADER.match(text, i)
+                if match and match.end() == n and not final:
+                    self.carry = text[i:]  # More spaces may follow; hold the whole run back
+                    return tokens
+                if match:
+                    style = f"h{len(match.group(1))}"
+                    self.open_styles.append(style)
+                    tokens.append(("open", style))
+                    self.line_start = False
+                    i = match.end()
+                    continue
+                if not final and HEADER_PREFIX.fullmatch(text, i):
+                    self.carry = text[i:]
+                    return tokens
+
+            match = SPECIAL.search(text, i)
+            j = match.start() if match else n
+            if j > i:
+                tokens.append(("text", text[i:j]))
+                self.line_start = False
+            if not match:
+                break
+
+            char = text[j]
+            if char == "\n":
+                for style in reversed(self.open_styles):
+                    if style not in ("code", "fence"):
+                        self._close(tokens, style)
+                tokens.append(("text", "\n"))
+                self.line_start = True
+                i = j + 1
+                continue
+
+            self.line_start = False
+            if char == "[":
+                link = LINK.match(text, j)
+                if link:
+                    tokens.append(("link", (link.group(1), link.group(2))))
+                    i = link.end()
+                elif not final and n - j < MAX_LINK and LINK_PREFIX.fullmatch(text, j):
+                    self.carry = text[j:]
+                    return tokens
+                else:
+                    tokens.append(("text", "["))
+                    i = j + 1
+                continue
+
+            run = len(text[j:j + 3]) - len(text[j:j + 3].lstrip(char))
+            if j + run == n and not final:
+                self.carry = text[j:]  # Need the next character to decide
+                return tokens
+
+            if char == "`":
+                if run == 3:
+                    style = "fence"
+                elif run == 1:
+                    style = "code"
+                else:
+                    tokens.append(("text", "``"))  # Empty inline code
+                    i = j + 2
+                    continue
+                self.open_styles.append(style)
+                tokens.append(("open", style))
+                i = j + run
+                continue
+
+            # "*": two or more stars are bold, one is italic
+            width = 2 if run >= 2 else 1
+            style = "bold" if width == 2 else "italic"
+            following = text[j + width:j + width + 1]
+            if style in self.open_styles:
+                self._close(tokens, style)
+            elif following and not following.isspace():
+                self.open_styles.append(style)
+                tokens.append(("open", style))
+            else:
+                tokens.append(("text", char * width))  # List bullet or a stray star
+            i = j + width
+        return tokens
+
+def tokenize(text):
+    tokenizer = MarkdownTokenizer()
+    return tokenizer.feed(text) + tokenizer.close()
+
+# ANSI RENDERING
+RESET = "\033[0m"
+ANSI_STYLES = {
+    "h1": "\033[1;34m",      # Blue bold
+    "h2": "\033[1;36m",      # Cyan bold
+    "h3": "\033[1;32m",      # Green bold
+    "bold": "\033[1m",
+    "italic": "\033[4m",     # Underline, since italic isn't well supported
+    "code": "\033[43;30m",   # Yellow background
+    "fence": "\033[100;37m",
+}
+
+class AnsiRenderer:
+    """Turns streamed Markdown chunks into ANSI colored text for the console."""
+
+    def __init__(self):
+        self.tokenizer = MarkdownTokenizer()
+        self.styles = []
+
+    def feed(self, chunk):
+        return self.render(self.tokenizer.feed(chunk))
+
+    def close(self):
+        return self.render(self.tokenizer.close())
+
+    def render(self, tokens):
+        out = []
+        for kind, value in tokens:
+            if kind == "text":
+                out.append(value)
+            elif kind == "link":
+                text, url = value
+                out.append(f"{ANSI_STYLES['italic']}{text}{RESET} ({url})")
+                out.extend(ANSI_STYLES.get(style, ANSI_STYLES["h3"]) for style in self.styles)
+            elif kind == "open":
+                self.styles.append(value)
+                out.append(ANSI_STYLES.get(value, ANSI_STYLES["h3"]))
+                if value == "code":
+                    out.append(" ")
+            else:
+                if value == "code":
+                    out.append(" ")
+                self.styles.remove(value)
+                # A reset clears every style, so put back the ones still open
+                out.append(RESET)
+                out.extend(ANSI_STYLES.get(style, ANSI_STYLES["h3"]) for style in self.styles)
+        return "".join(out)
+
+def markdown_to_ansi(text):
+    """Convert basic Markdown to ANSI color codes for PowerShell"""
+    renderer = AnsiRenderer()
+    return renderer.feed(text) + renderer.close()
+
+def clean_markdown(text):
+    """Strip Markdown formatting for plain text output"""
+    out = []
+    for kind, value in tokenize(text):
+        if kind == "text":
+            out.append(value)
+        elif kind == "link":
+            out.append(value[0])
+    return "".join(out)
+
+# BENCHMARK
+SAMPLE = """# Exiting vim
+
+Press `Esc`, then type **:q!** to quit *without* saving, or `:wq` to save.
+
+## Details
+* Use [the manual](https://vimhelp.org) for more.
+* A **bold *nested* span** and a stray * star.
+
+```
+:wq
+```
+"""
+
+def synthetic_chunks(megabytes, seed=0):
+    rng = random.Random(seed)
+    text = SAMPLE * (megabytes * 1024 * 1024 // len(SAMPLE))
+    chunks = []
+    i = 0
+    while i < len(text):
+        size = rng.randint(1, 24)  # Roughly the size of streamed completion chunks
+        chunks.append(text[i:i + size])
+        i += size
+    return text, chunks
+
+# Fragments that exercise every held-back marker: header hashes and their spaces, star and backtick runs, links
+FUZZ_PIECES = ["#", "##", " ", "  ", "\t", "*", "**", "`", "```", "[a](b)", "[", "]", "(", ")", "word", "\n"]
+
+def render_chunked(text, cuts):
+    renderer = AnsiRenderer()
+    out = []
+    previous = 0
+    for cut in cuts + [len(text)]:
+        out.append(renderer.feed(text[previous:cut]))
+        previous = cut
+    out.append(renderer.close())
+    return "".join(out)
+
+def check_chunk_boundaries(trials=20000, seed=0):
+    """Cut random Markdown at random places and check every cut renders like the whole text."""
+    rng = random.Random(seed)
+    assert render_chunked("#  Title", [2]) == markdown_to_ansi("#  Title"), "a header's space run split across chunks"
+    for _ in range(trials):
+        text = "".join(rng.choice(FUZZ_PIECES) for _ in range(rng.randint(1, 30)))
+        cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(0, 6)))) if len(text) > 1 else []
+        assert render_chunked(text, cuts) == markdown_to_ansi(text), f"chunking {text!r} at {cuts} changes the output"
+    print(f"{trials} random chunkings render the same as the whole text")
+
+def benchmark(sizes=(1, 4)):
+    """Render multi-megabyte streams chunk by chunk and check the result doesn't depend on chunking."""
+    for megabytes in sizes:
+        text, chunks = synthetic_chunks(megabytes)
+        renderer = AnsiRenderer()
+        out = []
+        start = time.perf_counter()
+        for chunk in chunks:
+            out.append(renderer.feed(chunk))
+        out.append(renderer.close())
+        elapsed = time.perf_counter() - start
+        assert "".join(out) == markdown_to_ansi(text), "chunked output differs from whole-text output"
+        print(f"{megabytes} MB in {len(chunks)} chunks: {elapsed * 1000:.0f} ms, {len(text) / elapsed / 1e6:.1f} MB/s")
+
+if __name__ == "__main__":
+    check_chunk_boundaries()
+    benchmark()
@@ -0,0 +1,124 @@
+import time
+import random
+
+class CommandMatcher:
+    """Keyword matcher compiled once from a COMMANDS dict.
+
+    Every command is indexed under its rarest keyword, so an utterance only
+    checks the handful of commands that could possibly match it. When several
+    commands match, the one with the most keywords wins; ties go to whichever
+    was declared first in COMMANDS.
+    """
+
+    def __init__(self, commands):
+        self.entries = []   # (keyword set, order, keywords, func)
+        self.index = {}     # keyword -> [entry ids]
+        self.always = []    # entries with no keywords match every utterance
+        self.extendable = set()  # keyword sets that some longer command strictly contains
+
+        frequency = {}
+        for keywords in commands:
+            for word in set(keywords):
+                frequency[word] = frequency.get(word, 0) + 1
+
+        for order, (keywords, func) in enumerate(commands.items()):
+            keyset = frozenset(keywords)
+            entry_id = len(self.entries)
+            self.entries.append((keyset, order, keywords, func))
+            if not keyset:
+                self.always.append(entry_id)
+                continue
+            rarest = min(keyset, key=lambda word: (frequency[word], word))
+            self.index.setdefault(rarest, []).append(entry_id)
+
+        # A longer command containing this one must also contain its rarest keyword
+        containing = {}
+        for entry in self.entries:
+            for word in entry[0]:
+                containing.setdefault(word, []).append(entry[0])
+        for keyset, _, _, _ in self.entries:
+            if keyset:
+                others = containing[min(keyset, key=lambda word: len(containing[word]))]
+            else:
+                others = [entry[0] for entry in self.entries]
+            if any(keyset < other for other in others):
+                self.extendable.add(keyset)
+
+    def candidates(self, words):
+        found = list(self.always)
+        for word in words:
+            found.extend(self.index.get(word, ()))
+        return found
+
+    def match_all(self, command):
+        """Return every (keywords, func) that matches, most specific first."""
+        words = set(command.split())
+        matches = [self.entries[i] for i in self.candidates(words) if self.entries[i][0] <= words]
+        matches.sort(key=lambda entry: (-len(entry[0]), entry[1]))
+        return [(keywords, func) for _, _, keywords, func in matches]
+
+    def match(self, command):
+        """Return the most specific (keywords, func) for command, or None."""
+        words = set(command.split())
+        best = None
+        for i in self.candidates(words):
+            keyset, order, keywords, func = self.entries[i]
+            if keyset <= words:
+                rank = (-len(keyset), order)
+                if best is None or rank < best[0]:
+                    best = (rank, keywords, func)
+        if best is None:
+            return None
+        return best[1], best[2]
+
+    def match_unambiguous(self, command):
+        """Like match, but None while a longer command could still extend the match.
+
+        Used on partial transcripts: "play" may still become "play music", but
+        "next song" can't grow into anything else and is safe to run early.
+        """
+        match = self.match(command)
+        if match is None:
+            return None
+        if frozenset(match[0]) in self.extendable:
+            return None
+        return match
+
+def benchmark(n_commands=5000, n_utterances=10000, seed=0):
+    """Time matching against a large synthetic command table."""
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(2000)]
+    commands = {}
+    while len(commands) < n_commands:
+        keywords = tuple(rng.sample(vocabulary, rng.randint(1, 4)))
+        commands[keywords] = lambda command: None
+
+    start = time.perf_counter()
+    matcher = CommandMatcher(commands)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    keyword_lists = list(commands)
+    utterances = []
+    for _ in range(n_utterances):
+        words = list(rng.choice(keyword_lists)) + rng.sample(vocabulary, 6)
+        rng.shuffle(words)
+        utterances.append(" ".join(words))
+
+    start = time.perf_counter()
+    for utterance in utterances:
+        matcher.match(utterance)
+    per_match_us = (time.perf_counter() - start) / n_utterances * 1e6
+
+    start = time.perf_counter()
+    for utterance in utterances:
+        matcher.match_unambiguous(utterance)
+    per_unambiguous_us = (time.perf_counter() - start) / n_utterances * 1e6
+
+    print(f"Commands: {n_commands}, utterances: {n_utterances}")
+    print(f"Build time: {build_ms:.2f} ms")
+    print(f"Average match time: {per_match_us:.1f} us")
+    print(f"Average unambiguous match time: {per_unambiguous_us:.1f} us")
+    return per_match_us
+
+if __name__ == "__main__":
+    benchmark()
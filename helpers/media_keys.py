@@ -0,0 +1,196 @@
+import ctypes
+import sys
+import threading
+import time
+from collections import deque
+
+# VIRTUAL KEY CODES
+VK_MEDIA_PLAY_PAUSE = 0xB3
+VK_MEDIA_NEXT_TRACK = 0xB0
+VK_MEDIA_PREV_TRACK = 0xB1
+VK_VOLUME_UP = 0xAF
+VK_VOLUME_DOWN = 0xAE
+VK_VOLUME_MUTE = 0xAD
+
+KEYEVENTF_KEYUP = 0x0002
+INPUT_KEYBOARD = 1
+
+KEYS = {
+    "play_pause": VK_MEDIA_PLAY_PAUSE,
+    "next": VK_MEDIA_NEXT_TRACK,
+    "previous": VK_MEDIA_PREV_TRACK,
+    "volume_up": VK_VOLUME_UP,
+    "volume_down": VK_VOLUME_DOWN,
+    "mute": VK_VOLUME_MUTE,
+}
+TOGGLES = {"play_pause", "mute"}  # Pressing these twice in a row does nothing
+OPPOSITES = {"volume_up": "volume_down", "volume_down": "volume_up"}
+
+# SENDINPUT STRUCTURES
+class KEYBDINPUT(ctypes.Structure):
+    _fields_ = [
+        ("wVk", ctypes.c_ushort),
+        ("wScan", ctypes.c_ushort),
+        ("dwFlags", ctypes.c_ulong),
+        ("time", ctypes.c_ulong),
+        ("dwExtraInfo", ctypes.c_size_t),
+    ]
+
+class MOUSEINPUT(ctypes.Structure):  # Only here so the union has the real INPUT size
+    _fields_ = [
+        ("dx", ctypes.c_long),
+        ("dy", ctypes.c_long),
+        ("mouseData", ctypes.c_ulong),
+        ("dwFlags", ctypes.c_ulong),
+        ("time", ctypes.c_ulong),
+        ("dwExtraInfo", ctypes.c_size_t),
+    ]
+
+class INPUT_UNION(ctypes.Union):
+    _fields_ = [("ki", KEYBDINPUT), ("mi", MOUSEINPUT)]
+
+class INPUT(ctypes.Structure):
+    _fields_ = [("type", ctypes.c_ulong), ("u", INPUT_UNION)]
+
+class SendInputBackend:
+    """Injects a whole batch of key presses with one SendInput call."""
+
+    def __init__(self):
+        self.user32 = ctypes.WinDLL("user32", use_last_error=True)
+
+    def inject(self, vk_codes):
+        inputs = (INPUT * (len(vk_codes) * 2))()
+        for i, vk_code in enumerate(vk_codes):
+            for j, flags in enumerate((0, KEYEVENTF_KEYUP)):
+                event = inputs[i * 2 + j]
+                event.type = INPUT_KEYBOARD
+                event.u.ki.wVk = vk_code
+                event.u.ki.dwFlags = flags
+        sent = self.user32.SendInput(len(inputs), inputs, ctypes.sizeof(INPUT))
+        if sent != len(inputs):
+            raise ctypes.WinError(ctypes.get_last_error())
+
+class RecordingBackend:
+    """Records injected batches instead of pressing keys, for Linux and tests."""
+
+    def __init__(self, cost=0.0):
+        self.cost = cost  # Seconds each injection takes, to simulate a slow backend
+        self.batches = []  # (perf_counter timestamp, vk codes)
+
+    def inject(self, vk_codes):
+        if self.cost:
+            time.sleep(self.cost)
+        self.batches.append((time.perf_counter(), list(vk_codes)))
+
+def default_backend():
+    return SendInputBackend() if sys.platform == "win32" else RecordingBackend()
+
+class MediaKeyQueue:
+    """Presses media keys on a worker thread so commands return immediately.
+
+    Presses still waiting for the worker are coalesced: repeated volume steps
+    add up (and opposite steps cancel), and a second play/pause or mute
+    cancels the first. The worker waits `window` seconds after the first
+    press for more to arrive, then sends everything pending in one batch.
+    """
+
+    def __init__(self, backend=None, window=0.02):
+        self.backend = backend or default_backend()
+        self.window = window
+        self.condition = threading.Condition()
+        self.pending = deque()  # [key name, count]
+        self.busy = False
+        self.thread = None
+        self.requested = 0
+        self.injected = 0
+        self.batches = 0
+
+    def press(self, key, count=1):
+        if key not in KEYS:
+            raise ValueError(f"Unknown media key: {key}")
+        with self.condition:
+            self.requested += count
+            last = self.pending[-1] if self.pending else None
+            if last and last[0] == key and key in TOGGLES:
+                count = (last[1] + count) % 2
+                self.pending.pop()
+                if count:
+                    self.pending.append([key, count])
+            elif last and last[0] == key:
+                last[1] += count
+            elif last and last[0] == OPPOSITES.get(key):
+                last[1] -= count
+                if last[1] < 0:
+                    self.pending[-1] = [key, -last[1]]
+                elif last[1] == 0:
+                    self.pending.pop()
+            else:
+                self.pending.append([key, count])
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True, name="garmin-media-keys")
+                self.thread.start()
+            self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+            time.sleep(self.window)
+            with self.condition:
+                keys = [KEYS[key] for key, count in self.pending for _ in range(count)]
+                self.pending.clear()
+                self.busy = True
+            try:
+                if keys:
+                    self.backend.inject(keys)
+            except Exception as e:
+                print(f"Error sending media keys: {e}")
+            with self.condition:
+                self.busy = False
+                self.injected += len(keys)
+                self.batches += bool(keys)
+                self.condition.notify_all()
+
+    def wait_idle(self, timeout=5.0):
+        """Block until every press so far has been sent; False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while self.pending or self.busy:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            return True
+
+    def stats(self):
+        with self.condition:
+            return {"requested": self.requested, "injected": self.injected, "batches": self.batches, "pending": len(self.pending)}
+
+def benchmark(commands=20):
+    """Time "volume up" commands the old way (5 presses, 50 ms each) and through the queue."""
+    old = RecordingBackend()
+    start = time.perf_counter()
+    for _ in range(commands):
+        for _ in range(5):
+            time.sleep(0.05)  # send_key held each key down for 50 ms
+            old.inject([VK_VOLUME_UP])
+    old_ms = (time.perf_counter() - start) * 1000
+
+    backend = RecordingBackend()
+    queue = MediaKeyQueue(backend)
+    start = time.perf_counter()
+    for _ in range(commands):
+        queue.press("volume_up", 5)
+    queued_ms = (time.perf_counter() - start) * 1000
+    queue.press("play_pause")
+    queue.press("play_pause")  # Cancels out
+    queue.wait_idle()
+    done_ms = (backend.batches[-1][0] - start) * 1000
+
+    print(f"{commands} x volume up, old send_key loop: {old_ms:.0f} ms blocking, {len(old.batches)} injections")
+    print(f"{commands} x volume up, media key queue: {queued_ms:.2f} ms blocking, sent {done_ms:.1f} ms later in {len(backend.batches)} injection(s)")
+    print(f"Queue stats: {queue.stats()}")
+
+if __name__ == "__main__":
+    benchmark()
@@ -1,109 +1,448 @@
 import os
-import re
 import sys
+import hashlib
+import json
+import queue
+import secrets
+import socket
+import threading
+import time
+from collections import deque
 from dotenv import load_dotenv
 load_dotenv()
 
-from mistralai import Mistral
 import subprocess
+import tempfile
+from multiprocessing.connection import Client, Listener
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 
-api_key = os.environ["MISTRAL_API_KEY"]
+try:
+    from .cache import LRUCache
+    from .markdown import AnsiRenderer, clean_markdown, markdown_to_ansi
+    from .tracing import traced
+except ImportError:
+    from cache import LRUCache
+    from markdown import AnsiRenderer, clean_markdown, markdown_to_ansi
+    from tracing import traced
+
+api_key = os.getenv("MISTRAL_API_KEY")
 model = "mistral-small-2503"
-def markdown_to_ansi(text):
-    """Convert basic Markdown to ANSI color codes for PowerShell"""
-    # Headers
-    text = re.sub(r'^# (.*?)$', r'\033[1;34m\1\033[0m', text, flags=re.MULTILINE)  # Blue bold
-    text = re.sub(r'^## (.*?)$', r'\033[1;36m\1\033[0m', text, flags=re.MULTILINE)  # Cyan bold
-    text = re.sub(r'^### (.*?)$', r'\033[1;32m\1\033[0m', text, flags=re.MULTILINE)  # Green bold
-    
-    # Bold
-    text = re.sub(r'\*\*(.*?)\*\*', r'\033[1m\1\033[0m', text)
-    
-    # Italic (show as underline since italic isn't well supported)
-    text = re.sub(r'\*(.*?)\*', r'\033[4m\1\033[0m', text)
-    
-    # Code blocks
-    text = re.sub(r'`([^`]+)`', r'\033[43;30m \1 \033[0m', text)  # Yellow background
-    
-    # Code blocks (triple backticks)
-    text = re.sub(r'```(.*?)```', r'\033[100;37m\1\033[0m', text, flags=re.DOTALL)
-    
-    return text
+client = None  # Created on first use by get_client, so importing this module stays cheap
+client_lock = threading.Lock()
+KEEPALIVE = float(os.getenv("MISTRAL_KEEPALIVE", "60"))  # Seconds between re-warms while the worker is idle
+KEEPALIVE_FOR = float(os.getenv("MISTRAL_KEEPALIVE_FOR", "900"))  # Stop re-warming after this long without a question
 
-def clean_markdown(text):
-    """Strip Markdown formatting for plain text output"""
-    # Remove headers
-    text = re.sub(r'^#+\s+', '', text, flags=re.MULTILINE)
-    
-    # Remove bold/italic
-    text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)
-    text = re.sub(r'\*(.*?)\*', r'\1', text)
-    
-    # Remove code formatting
-    text = re.sub(r'`([^`]+)`', r'\1', text)
-    text = re.sub(r'```(.*?)```', r'\1', text, flags=re.DOTALL)
-    
-    # Remove links
-    text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text)
-    
-    return text
+def get_client():
+    global client
+    with client_lock:
+        if client is None:
+            if not api_key:
+                raise RuntimeError("MISTRAL_API_KEY is not set")
+            import httpx
+            from mistralai import Mistral  # Slow to import, and only the chat worker needs it
+            # httpx drops pooled connections after 5 idle seconds by default, which undoes warm_up
+            http = httpx.Client(follow_redirects=True, limits=httpx.Limits(keepalive_expiry=KEEPALIVE * 2))
+            client = Mistral(api_key=api_key, server_url=os.getenv("MISTRAL_SERVER_URL"), client=http)  # Server URL override is for local stubs
+        return client
 
-client = Mistral(api_key=api_key)
 system_prompt = """You are a helpful assistant. Please format your responses in clean, readable text.
 Use minimal markdown - only use **bold** for emphasis and `code` for technical terms.
 Avoid complex formatting, tables, or extensive markdown since this will be displayed in a terminal."""
 
-def question(text):
+def question(text, history=()):
     """Ask a question to the Mistral AI model and return the response."""
-    stream = client.chat.stream(
+    stream = get_client().chat.stream(
         model=model,
         messages=[
+            {"role": "system", "content": system_prompt},
+            *history,
             {"role": "user", "content": text},
-            {"role": "system", "content": system_prompt}
         ]
     )
     return stream 
 
-def process_question(question_text):
+# CHAT SESSION: follow-up questions carry earlier turns, within a token budget
+HISTORY_TOKENS = int(os.getenv("MISTRAL_HISTORY_TOKENS", "3000"))
+
+def estimate_tokens(text):
+    # Roughly 4 characters per token for English; close enough for a budget
+    return len(text) // 4 + 1
+
+class ChatSession:
+    """Conversation history for follow-up questions, kept under a token budget.
+
+    Each turn is a question and its answer. When the history grows past
+    `budget` tokens the oldest turns are dropped, and an answer too long to
+    fit on its own is cut to its end, so requests and memory stay bounded
+    however long the session runs.
+    """
+
+    def __init__(self, budget=HISTORY_TOKENS):
+        self.budget = budget
+        self.turns = deque()  # (question, answer, tokens)
+        self.tokens = 0
+        self.dropped = 0
+
+    def history(self):
+        messages = []
+        for question_text, answer_text, _ in self.turns:
+            messages.append({"role": "user", "content": question_text})
+            messages.append({"role": "assistant", "content": answer_text})
+        return messages
+
+    def add(self, question_text, answer_text):
+        room = self.budget - estimate_tokens(question_text)
+        if room <= 1:
+            answer_text = "..."  # A slice from -0 would keep the whole answer
+        elif estimate_tokens(answer_text) > room:
+            answer_text = "..." + answer_text[-(room * 4 - 4):]
+        tokens = estimate_tokens(question_text) + estimate_tokens(answer_text)
+        self.turns.append((question_text, answer_text, tokens))
+        self.tokens += tokens
+        while self.tokens > self.budget and self.turns:
+            self.tokens -= self.turns.popleft()[2]
+            self.dropped += 1
+
+    def clear(self):
+        self.turns.clear()
+        self.tokens = 0
+
+# ANSWER CACHE: repeated questions are answered from disk instead of the API
+ANSWER_CACHE = LRUCache(
+    maxsize=256,
+    ttl=7 * 24 * 3600,
+    path=os.getenv("MISTRAL_CACHE_PATH", os.path.join(os.path.dirname(__file__), '..', 'mistral_cache.json')),
+)
+BYPASS_PHRASE = "fresh answer"  # "question fresh answer how do I exit vim" asks the API again
+
+def normalize_question(question_text):
+    # Only case and spacing; punctuation and words like "n" or "c++" change the question
+    return " ".join(question_text.casefold().split())
+
+def cache_key(question_text):
+    prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+    return f"{model}:{prompt_hash}:{normalize_question(question_text)}"
+
+def split_bypass(question_text):
+    """Strip a leading bypass phrase; returns (question, use_cache)."""
+    words = question_text.split()
+    bypass = BYPASS_PHRASE.split()
+    # Two words, so a question that merely starts with "fresh" or "refresh" is left alone
+    if [word.lower() for word in words[:len(bypass)]] == bypass and len(words) > len(bypass):
+        return " ".join(words[len(bypass):]), False
+    return question_text, True
+
+def cache_stats():
+    return ANSWER_CACHE.stats()
+
+def stream_content(response):
+    for chunk in response:
+        content = chunk.data.choices[0].delta.content
+        if content:
+            yield content
+
+def render(contents, on_chunk=None):
+    renderer = AnsiRenderer()  # Keeps bold/code/header state across chunk boundaries
+    parts = []
+    for content in contents:
+        parts.append(content)
+        print(renderer.feed(content), end="", flush=True)
+        if on_chunk:
+            on_chunk(content)
+    print(renderer.close(), end="", flush=True)
+    return "".join(parts)
+
+def answer(question_text, on_chunk=None, use_cache=True, session=None):
+    """Stream an answer to the console, passing each raw chunk to on_chunk too.
+
+    With a session the question is asked with the earlier turns as context and
+    added to it. Only the first question of a session uses the answer cache,
+    since follow-ups depend on what came before.
+    """
+    question_text, wants_cache = split_bypass(question_text)
+    use_cache = use_cache and wants_cache and not (session and session.turns)
     print(f"\nAsking Mistral: {str.title(question_text)}")
     print("-" * 50)
     
-    
+    key = cache_key(question_text)
+    cached = ANSWER_CACHE.get(key) if use_cache else None
+    if cached is not None:
+        full_response = render([cached], on_chunk)
+    else:
+        history = session.history() if session else ()
+        full_response = render(stream_content(question(question_text, history)), on_chunk)
+        if full_response and not history:
+            ANSWER_CACHE.set(key, full_response)
+    if session is not None and full_response:
+        session.add(question_text, full_response)
+            
+    print("\n" + "-" * 50)
+    print("Response complete (cached)." if cached is not None else "Response complete.")
+    return full_response
+
+def process_question(question_text):
+    session = ChatSession()
+    while question_text and question_text.strip().lower() != "x":
+        try:
+            answer(question_text, session=session)
+            print("Ask another question or Enter to exit.")
+        except Exception as e:
+            print(f"Error calling Mistral API: {e}")
+            print("Ask again, or Enter or X to exit")
+        question_text = input()
+
+# CHAT WORKER: one long-lived process with a warm client, fed questions over local IPC
+WORKER_ADDRESS = ("127.0.0.1", int(os.getenv("MISTRAL_WORKER_PORT", "8765")))
+WORKER_SECRET_PATH = os.getenv("MISTRAL_WORKER_SECRET_PATH", os.path.join(os.path.dirname(__file__), '..', 'mistral_worker.key'))
+MAX_MESSAGE = 64 * 1024  # Bytes; questions and answer chunks are far smaller
+
+def worker_authkey():
+    """Random per-install secret shared by garmin and the worker, created on first use."""
     try:
-        response = question(question_text)
-        full_response = ""
-        
-        for chunk in response:
-            if chunk.data.choices[0].delta.content:
-                content = chunk.data.choices[0].delta.content
-                full_response += content
-                print(markdown_to_ansi(content), end="", flush=True)
-                
-        print("\n" + "-" * 50)
-        print("Response complete.")
-        print("Ask another question or Enter to exit.")
-        q = input()
-        if q: process_question(q)
-        
+        fd = os.open(WORKER_SECRET_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, "wb") as f:
+            f.write(secrets.token_bytes(32))
+    if os.name == "posix" and os.stat(WORKER_SECRET_PATH).st_mode & 0o077:
+        raise PermissionError(f"{WORKER_SECRET_PATH} can be read by other users, run: chmod 600 {WORKER_SECRET_PATH}")
+    with open(WORKER_SECRET_PATH, "rb") as f:
+        authkey = f.read()
+    if len(authkey) < 32:
+        raise ValueError(f"{WORKER_SECRET_PATH} is too short to be a worker secret, delete it to make a new one")
+    return authkey
+
+# Messages are JSON, never pickles, so a connection can only ever deliver data
+def send_message(conn, message):
+    conn.send_bytes(json.dumps(message).encode("utf-8"))
+
+def recv_message(conn):
+    return json.loads(conn.recv_bytes(MAX_MESSAGE).decode("utf-8"))
+
+def no_delay(conn):
+    # Small request and chunk messages would otherwise wait on Nagle and delayed ACKs
+    with socket.fromfd(conn.fileno(), socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return conn
+
+def warm_up():
+    # Opens the TLS connection before the first question needs it
+    try:
+        get_client().models.list()
     except Exception as e:
-        print(f"Error calling Mistral API: {e}")
-        print("Press Enter to continue or X to exit")
-        input()
+        print(f"Mistral warm-up failed: {e}")
+
+def serve():
+    """Answer questions from garmin (and typed into this console) in this one window."""
+    questions = queue.Queue()  # (question text, connection to stream chunks back to or None, new conversation)
+    session = ChatSession()
+    listener = Listener(WORKER_ADDRESS, authkey=worker_authkey())
+
+    def receive(conn):
+        try:
+            request = recv_message(conn)
+        except (EOFError, OSError, ValueError):
+            conn.close()
+            return
+        if not isinstance(request, dict) or not isinstance(request.get("question"), str):
+            print("Ignored a malformed worker request")
+            conn.close()
+            return
+        reply = request.get("reply") is True
+        questions.put((request["question"], conn if reply else None, True))
+        if not reply:
+            conn.close()
+
+    def accept():
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:  # Bad authkey or dropped connection
+                print(f"Rejected worker connection: {e}")
+                continue
+            threading.Thread(target=receive, args=(no_delay(conn),), daemon=True).start()
+
+    def read_console():
+        while True:
+            try:
+                line = input()
+            except EOFError:
+                return
+            if line.strip() == "/stats":
+                print(f"Answer cache: {cache_stats()}")
+                print(f"Chat history: {len(session.turns)} turns, ~{session.tokens} tokens, {session.dropped} dropped")
+            elif line.strip() == "/new":
+                questions.put((None, None, True))
+            elif line.strip():
+                questions.put((line.strip(), None, False))
+
+    threading.Thread(target=warm_up, daemon=True).start()
+    threading.Thread(target=accept, daemon=True).start()
+    threading.Thread(target=read_console, daemon=True).start()
+    print("Mistral worker ready. Ask by voice or type a follow-up here (/new to start over, /stats for stats).")
+
+    last_question = time.monotonic()
+    while True:
+        try:
+            question_text, conn, new_conversation = questions.get(timeout=KEEPALIVE)
+        except queue.Empty:
+            # The server closes idle connections too, so touch it before the next question pays for a handshake,
+            # but only for a while: a worker nobody talks to shouldn't keep calling the API
+            if time.monotonic() - last_question < KEEPALIVE_FOR:
+                threading.Thread(target=warm_up, daemon=True).start()
+            continue
+        last_question = time.monotonic()
+        if new_conversation:
+            session.clear()  # Voice questions and /new start over; typed follow-ups continue
+        if question_text is None:
+            print("Started a new conversation.")
+            continue
+        try:
+            answer(question_text, (lambda chunk: send_message(conn, chunk)) if conn else None, session=session)
+        except Exception as e:
+            print(f"Error calling Mistral API: {e}")
+        finally:
+            if conn:
+                try:
+                    send_message(conn, None)  # End of answer
+                    conn.close()
+                except OSError:
+                    pass
+        print("Ask another question here or by voice.")
 
+def start_worker(**popen_args):
+    mistral_path = os.path.join(os.path.dirname(__file__), "mistral.py")
+    popen_args.setdefault("creationflags", getattr(subprocess, "CREATE_NEW_CONSOLE", 0))
+    return subprocess.Popen([sys.executable, mistral_path, "--serve"], **popen_args)
+
+def connect_to_worker(spawn=True, timeout=15):
+    """Connect to the chat worker, starting it first if spawn is set and it isn't running."""
+    authkey = worker_authkey()  # Creates the secret before a spawned worker looks for it
+    try:
+        return no_delay(Client(WORKER_ADDRESS, authkey=authkey))
+    except ConnectionRefusedError:
+        if spawn:
+            start_worker()
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return no_delay(Client(WORKER_ADDRESS, authkey=authkey))
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+def ask_worker(question_text, reply=False, spawn=True):
+    """Send a question to the worker; with reply=True, returns the connection answer chunks arrive on."""
+    conn = connect_to_worker(spawn)
+    send_message(conn, {"question": question_text, "reply": reply})
+    if reply:
+        return conn
+    conn.close()
+
+@traced("mistral.launch")
 def call_mistral_with_question(full_command):
     question_text = full_command.replace("question", "").strip()
     if question_text:
-        mistral_path = os.path.join(os.path.dirname(__file__), "mistral.py")
-        subprocess.Popen([
-            "python", mistral_path, question_text
-        ], creationflags=subprocess.CREATE_NEW_CONSOLE)
+        ask_worker(question_text)
     else:
         print("No question detected after 'question' command")
 
+# TIME-TO-FIRST-TOKEN BENCHMARK AGAINST A LOCAL STUB OF THE CHAT API
+class StubChatHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    first_token_delay = 0.05  # Pretend model latency
+
+    def send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+    def do_GET(self):  # models.list for warm_up
+        body = b'{"object": "list", "data": []}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(self.first_token_delay)
+        for word in ["Stub ", "answer ", "with ", "**bold** ", "text."]:
+            event = {"id": "stub", "object": "chat.completion.chunk", "created": 0, "model": model,
+                     "choices": [{"index": 0, "delta": {"role": "assistant", "content": word}, "finish_reason": None}]}
+            self.send_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        self.send_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        pass
+
+def benchmark_ttft(rounds=5):
+    """Compare spawning a process per question with asking the warm worker.
+
+    Needs MISTRAL_API_KEY set to anything, e.g. MISTRAL_API_KEY=stub.
+    """
+    global WORKER_ADDRESS
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubChatHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    with Listener(("127.0.0.1", 0)) as probe:
+        WORKER_ADDRESS = probe.address  # A free port for this run's worker
+    cache_dir = tempfile.TemporaryDirectory()  # Keep stub answers out of the real cache
+    env = dict(os.environ, MISTRAL_SERVER_URL=f"http://127.0.0.1:{server.server_address[1]}",
+               MISTRAL_WORKER_PORT=str(WORKER_ADDRESS[1]), PYTHONUNBUFFERED="1",
+               MISTRAL_CACHE_PATH=os.path.join(cache_dir.name, "mistral_cache.json"))
+    mistral_path = os.path.join(os.path.dirname(__file__), "mistral.py")
+
+    spawn_times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, mistral_path, "fresh answer benchmark question"],
+                                   stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, env=env)
+        while process.stdout.readline().strip() != b"-" * 50:
+            pass
+        process.stdout.read(1)  # First byte of the answer
+        spawn_times.append((time.perf_counter() - start) * 1000)
+        process.kill()
+        process.wait()
+
+    worker = start_worker(stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, env=env, creationflags=0)
+    worker_times = []
+    cached_times = []
+    try:
+        connect_to_worker(spawn=False, timeout=30).close()  # Wait until it's listening
+        for times, text in ((worker_times, "fresh answer benchmark question"), (cached_times, "benchmark question")):
+            for _ in range(rounds):
+                start = time.perf_counter()
+                conn = ask_worker(text, reply=True, spawn=False)
+                recv_message(conn)
+                times.append((time.perf_counter() - start) * 1000)
+                while recv_message(conn) is not None:
+                    pass
+                conn.close()
+    finally:
+        worker.kill()
+        worker.wait()
+        server.shutdown()
+        cache_dir.cleanup()
+
+    for label, times in (("Spawn per question:", spawn_times), ("Warm worker:", worker_times), ("Cached answer:", cached_times)):
+        times.sort()
+        print(f"{label:<20}median time to first token {times[len(times) // 2]:.1f} ms")
+
 if __name__ == "__main__":
-    if len(sys.argv) > 1: # RUNS AS A NEW PROCESS
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        serve()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--benchmark":
+        benchmark_ttft()
+    elif len(sys.argv) > 1: # RUNS AS A NEW PROCESS
         print(sys.argv)
         question_text = " ".join(sys.argv[1:])
         process_question(question_text)
     else:
-        process_question()
\ No newline at end of file
+        serve()
@@ -0,0 +1,253 @@
+import copy
+import threading
+import time
+
+class PlayerState:
+    """In-memory mirror of the Spotify player: current track, queue and active device.
+
+    fetch_player() returns the /me/player JSON, {} when no device is active or
+    None on error; fetch_queue() returns the /me/player/queue JSON or None.
+    Readers pass max_age to say how stale a snapshot they accept; anything
+    older is fetched again first, so max_age=0 always means a fresh read. If
+    that fetch fails they get None rather than the older snapshot.
+
+    Once started (by the first read, with autostart), a poller keeps the
+    mirror warm. It polls every `fast_interval` seconds for `settle` seconds
+    after anything changed, at most every `play_interval` seconds while
+    playing (sooner if the track is about to end) and every `idle_interval`
+    seconds otherwise. Our own writes are applied to the mirror optimistically
+    (apply_skip, apply_queued...) and count as a change, so the next polls
+    confirm them quickly.
+    """
+
+    def __init__(self, fetch_player, fetch_queue, fast_interval=1.0, play_interval=10.0, idle_interval=30.0, settle=10.0, autostart=False):
+        self.fetch_player = fetch_player
+        self.fetch_queue = fetch_queue
+        self.fast_interval = fast_interval
+        self.play_interval = play_interval
+        self.idle_interval = idle_interval
+        self.settle = settle
+        self.autostart = autostart
+        self.condition = threading.Condition()
+        self.player = None      # Last /me/player snapshot, {} for no active device
+        self.queue = None       # Last /me/player/queue snapshot
+        self.queued_uris = set()  # Tracks we queued that are still in the queue
+        self.updated_at = {"player": 0.0, "queue": 0.0}  # monotonic time of last fetch
+        self.changed_at = 0.0
+        self.thread = None
+        self.running = False
+        self.fetches = 0
+        self.reads = 0
+
+    # READS
+    def staleness(self, part="player"):
+        """Seconds since that part was last fetched; infinity if never."""
+        with self.condition:
+            updated_at = self.updated_at[part]
+        return time.monotonic() - updated_at if updated_at else float("inf")
+
+    def get_player(self, max_age=5.0):
+        self.reads += 1
+        if self.autostart:
+            self.start()
+        if self.staleness("player") > max_age and not self.refresh_player():
+            return None
+        with self.condition:
+            return copy.deepcopy(self.player)
+
+    def get_queue(self, max_age=5.0):
+        self.reads += 1
+        if self.autostart:
+            self.start()
+        if self.staleness("queue") > max_age and not self.refresh_queue():
+            return None
+        with self.condition:
+            return copy.deepcopy(self.queue)
+
+    def device_active(self, max_age=10.0):
+        """True or False from a snapshot at most max_age old, else None. Never fetches."""
+        if self.staleness("player") > max_age:
+            return None
+        with self.condition:
+            return bool(self.player and self.player.get("device"))
+
+    def is_playing(self, max_age=5.0):
+        player = self.get_player(max_age)
+        return bool(player and player.get("is_playing"))
+
+    # REFRESHING
+    def refresh_player(self):
+        player = self.fetch_player()
+        with self.condition:
+            self.fetches += 1
+            if player is None:
+                return False
+            if self._summary(player) != self._summary(self.player):
+                self.changed_at = time.monotonic()
+            self.player = player
+            self.updated_at["player"] = time.monotonic()
+            return True
+
+    def refresh_queue(self):
+        queue = self.fetch_queue()
+        with self.condition:
+            self.fetches += 1
+            if queue is None:
+                return False
+            self.queue = queue
+            self.queued_uris &= {item.get("uri") for item in queue.get("queue") or [] if item}
+            self.updated_at["queue"] = time.monotonic()
+            return True
+
+    @staticmethod
+    def _summary(player):
+        if not player:
+            return None
+        return ((player.get("item") or {}).get("uri"), player.get("is_playing"), (player.get("device") or {}).get("id"))
+
+    # OPTIMISTIC UPDATES AFTER OUR OWN WRITES
+    def mark_changed(self):
+        with self.condition:
+            self.changed_at = time.monotonic()
+            self.condition.notify_all()
+
+    def invalidate(self):
+        """For changes made outside the Web API, like media keys, whose effect isn't known."""
+        with self.condition:
+            self.updated_at = {"player": 0.0, "queue": 0.0}
+        self.mark_changed()
+
+    def apply_skip(self, count=1):
+        with self.condition:
+            if self.queue is not None:
+                upcoming = self.queue.get("queue") or []
+                if count <= len(upcoming):
+                    self.queue["currently_playing"] = upcoming[count - 1]
+                    self.queue["queue"] = upcoming[count:]
+                else:
+                    self.updated_at["queue"] = 0.0  # Skipped past what we know
+            if self.player:
+                self.player["item"] = self.queue["currently_playing"] if self.queue and self.updated_at["queue"] else None
+                self.player["progress_ms"] = 0
+        self.mark_changed()
+
+    def apply_queued(self, tracks):
+        # Spotify plays queued tracks before the rest of the album or playlist, so they
+        # go after the last track we queued ourselves (or first), not at the end
+        with self.condition:
+            if self.queue is not None:
+                upcoming = self.queue.setdefault("queue", [])
+                boundary = 0
+                for i, item in enumerate(upcoming):
+                    if item and item.get("uri") in self.queued_uris:
+                        boundary = i + 1
+                upcoming[boundary:boundary] = [{"uri": t["uri"], "name": t.get("name", "")} for t in tracks]
+            self.queued_uris.update(t["uri"] for t in tracks)
+        self.mark_changed()
+
+    def apply_playing(self, is_playing):
+        with self.condition:
+            if self.player:
+                self.player["is_playing"] = is_playing
+        self.mark_changed()
+
+    def apply_no_device(self):
+        with self.condition:
+            self.player = {}
+            self.updated_at["player"] = time.monotonic()
+        self.mark_changed()
+
+    # POLLING
+    def interval(self):
+        with self.condition:
+            now = time.monotonic()
+            if now - self.changed_at < self.settle:
+                return self.fast_interval
+            player = self.player
+            if player and player.get("is_playing"):
+                item = player.get("item") or {}
+                if not item.get("duration_ms"):
+                    return self.play_interval  # Ads and some podcast episodes have no track length
+                remaining = (item["duration_ms"] - player.get("progress_ms", 0)) / 1000
+                elapsed = now - self.updated_at["player"]
+                # Poll just after the track should end, so the next one shows up promptly
+                return max(self.fast_interval, min(self.play_interval, remaining - elapsed + 0.5))
+            return self.idle_interval
+
+    def start(self):
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+            self.thread = threading.Thread(target=self._poll, daemon=True, name="spotify-player-state")
+            self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def _poll(self):
+        while True:
+            try:
+                self.refresh_player()
+                if self.player:  # No queue to read without an active device
+                    self.refresh_queue()
+            except Exception as e:
+                print(f"Failed to refresh Spotify player state: {e}")
+            polled_at = time.monotonic()
+            with self.condition:
+                # Our own writes wake this to switch to the fast interval, counted from the last poll
+                while self.running:
+                    remaining = polled_at + self.interval() - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                if not self.running:
+                    return
+
+    def stats(self):
+        return {
+            "player_staleness_s": round(self.staleness("player"), 2),
+            "queue_staleness_s": round(self.staleness("queue"), 2),
+            "next_poll_s": round(self.interval(), 2),
+            "fetches": self.fetches,
+            "reads": self.reads,
+            "polling": self.running,
+        }
+
+def benchmark(commands=20, latency=0.08):
+    """Count GETs and read latency for commands that check the player, with and without the mirror."""
+    calls = {"count": 0}
+    def fetch(snapshot):
+        def fetch():
+            calls["count"] += 1
+            time.sleep(latency)  # Stand-in for a Web API round trip
+            return copy.deepcopy(snapshot)
+        return fetch
+    player = {"is_playing": True, "device": {"id": "pc"}, "progress_ms": 0,
+              "item": {"uri": "spotify:track:0", "duration_ms": 200000}}
+    queue = {"currently_playing": player["item"], "queue": [{"uri": f"spotify:track:{i}"} for i in range(1, 40)]}
+
+    start = time.perf_counter()
+    for _ in range(commands):
+        fetch(player)()
+        fetch(queue)()
+    direct_ms = (time.perf_counter() - start) * 1000 / commands
+    direct_calls = calls["count"]
+
+    calls["count"] = 0
+    state = PlayerState(fetch(player), fetch(queue))
+    start = time.perf_counter()
+    for _ in range(commands):
+        state.is_playing()
+        state.get_queue()
+        state.apply_skip(1)
+    mirror_ms = (time.perf_counter() - start) * 1000 / commands
+
+    print(f"{commands} commands, {latency * 1000:.0f} ms per request")
+    print(f"Direct GETs: {direct_calls} requests, {direct_ms:.1f} ms of reads per command")
+    print(f"Mirror:      {calls['count']} requests, {mirror_ms:.1f} ms of reads per command, {state.stats()}")
+
+if __name__ == "__main__":
+    benchmark()
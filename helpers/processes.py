@@ -0,0 +1,261 @@
+import ctypes
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+import webbrowser
+from collections import namedtuple
+
+# An application garmin can open and close. launch is the argv to start it
+# (the program name is resolved like `start` would), image is the process
+# name to close and url is opened instead of launching, for web apps.
+App = namedtuple("App", ["launch", "image", "url"], defaults=(None, None, None))
+
+class WindowsBackend:
+    """Starts programs with CreateProcess/ShellExecute and ends them with TerminateProcess."""
+
+    APP_PATHS = r"Software\Microsoft\Windows\CurrentVersion\App Paths"
+    TH32CS_SNAPPROCESS = 0x00000002
+    PROCESS_TERMINATE = 0x0001
+    DETACHED_PROCESS = 0x00000008
+    CREATE_NEW_PROCESS_GROUP = 0x00000200
+
+    class PROCESSENTRY32(ctypes.Structure):
+        _fields_ = [
+            ("dwSize", ctypes.c_ulong),
+            ("cntUsage", ctypes.c_ulong),
+            ("th32ProcessID", ctypes.c_ulong),
+            ("th32DefaultHeapID", ctypes.c_size_t),
+            ("th32ModuleID", ctypes.c_ulong),
+            ("cntThreads", ctypes.c_ulong),
+            ("th32ParentProcessID", ctypes.c_ulong),
+            ("pcPriClassBase", ctypes.c_long),
+            ("dwFlags", ctypes.c_ulong),
+            ("szExeFile", ctypes.c_wchar * 260),
+        ]
+
+    def __init__(self):
+        self.kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        self.user32 = ctypes.WinDLL("user32", use_last_error=True)
+        self.kernel32.CreateToolhelp32Snapshot.restype = ctypes.c_void_p
+        self.kernel32.OpenProcess.restype = ctypes.c_void_p
+
+    def resolve(self, program):
+        # `start chrome` looks in App Paths before PATH, so do the same
+        import winreg
+        for root in (winreg.HKEY_CURRENT_USER, winreg.HKEY_LOCAL_MACHINE):
+            for name in (program, f"{program}.exe"):
+                try:
+                    with winreg.OpenKey(root, rf"{self.APP_PATHS}\{name}") as key:
+                        return winreg.QueryValue(key, None)
+                except OSError:
+                    pass
+        return shutil.which(program)
+
+    def launch(self, argv):
+        """Start argv detached and return the Popen, or None if only the shell could start it."""
+        path = self.resolve(argv[0])
+        if path:
+            return subprocess.Popen([path, *argv[1:]], close_fds=True,
+                                    creationflags=self.DETACHED_PROCESS | self.CREATE_NEW_PROCESS_GROUP)
+        os.startfile(argv[0])  # Protocol handlers and other registered names; no PID to track
+        return None
+
+    def open_url(self, url):
+        os.startfile(url)
+
+    def find_pids(self, image):
+        snapshot = self.kernel32.CreateToolhelp32Snapshot(self.TH32CS_SNAPPROCESS, 0)
+        if snapshot in (None, ctypes.c_void_p(-1).value):
+            raise ctypes.WinError(ctypes.get_last_error())
+        pids = []
+        try:
+            entry = self.PROCESSENTRY32()
+            entry.dwSize = ctypes.sizeof(entry)
+            found = self.kernel32.Process32FirstW(ctypes.c_void_p(snapshot), ctypes.byref(entry))
+            while found:
+                if entry.szExeFile.lower() == image.lower():
+                    pids.append(entry.th32ProcessID)
+                found = self.kernel32.Process32NextW(ctypes.c_void_p(snapshot), ctypes.byref(entry))
+        finally:
+            self.kernel32.CloseHandle(ctypes.c_void_p(snapshot))
+        return pids
+
+    def kill(self, pid):
+        handle = self.kernel32.OpenProcess(self.PROCESS_TERMINATE, False, pid)
+        if not handle:
+            return False
+        try:
+            return bool(self.kernel32.TerminateProcess(ctypes.c_void_p(handle), 1))
+        finally:
+            self.kernel32.CloseHandle(ctypes.c_void_p(handle))
+
+    def lock(self):
+        self.user32.LockWorkStation()
+
+    def shutdown(self, restart=False):
+        subprocess.Popen(["shutdown", "/r" if restart else "/s", "/t", "1"], creationflags=subprocess.CREATE_NO_WINDOW)
+
+class LinuxBackend:
+    """For running and testing garmin on Linux: exec directly, find processes in /proc, end them with signals."""
+
+    def resolve(self, program):
+        return shutil.which(program) or shutil.which(program.lower())
+
+    def launch(self, argv):
+        path = self.resolve(argv[0])
+        if not path:
+            raise FileNotFoundError(f"{argv[0]} not found on PATH")
+        return subprocess.Popen([path, *argv[1:]], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL, start_new_session=True)
+
+    def open_url(self, url):
+        webbrowser.open(url)
+
+    def find_pids(self, image):
+        # /proc/PID/comm holds at most 15 characters of the executable name
+        name = image[:-4] if image.lower().endswith(".exe") else image
+        name = name.lower()[:15]
+        pids = []
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/comm", encoding="utf-8") as f:
+                    if f.read().strip().lower() == name:
+                        pids.append(int(entry))
+            except OSError:
+                pass  # Exited while we were looking
+        return pids
+
+    def kill(self, pid):
+        try:
+            os.kill(pid, signal.SIGTERM)
+            return True
+        except OSError:
+            return False
+
+    def lock(self):
+        subprocess.Popen(["loginctl", "lock-session"])
+
+    def shutdown(self, restart=False):
+        subprocess.Popen(["systemctl", "reboot" if restart else "poweroff"])
+
+def default_backend():
+    return WindowsBackend() if sys.platform == "win32" else LinuxBackend()
+
+class ProcessManager:
+    """Opens and closes applications without going through a shell.
+
+    Processes it starts are tracked by app name, so closing an app ends those
+    by handle first, then anything else running under the app's image name.
+    Launches return as soon as the process is created.
+    """
+
+    def __init__(self, apps, backend=None):
+        self.apps = apps
+        self.backend = backend or default_backend()
+        self.lock = threading.Lock()
+        self.started = {}  # app name -> list of Popen
+
+    def open(self, name):
+        app = self.apps[name]
+        if app.url:
+            self.backend.open_url(app.url)
+            return None
+        process = self.backend.launch(list(app.launch))
+        if process is not None:
+            with self.lock:
+                self.started.setdefault(name, []).append(process)
+        return process
+
+    def close(self, name):
+        """End the app's processes; returns how many were stopped."""
+        app = self.apps[name]
+        if not app.image:
+            print(f"{name.title()} is a web app, no process to close.")
+            return 0
+        with self.lock:
+            tracked = self.started.pop(name, [])
+        stopped = set()
+        for process in tracked:
+            if process.poll() is None:
+                process.terminate()
+                stopped.add(process.pid)
+        for process in tracked:
+            try:
+                process.wait(timeout=1)  # Reap it so it doesn't linger as a zombie
+            except subprocess.TimeoutExpired:
+                pass
+        for pid in self.backend.find_pids(app.image):
+            if pid not in stopped and pid != os.getpid() and self.backend.kill(pid):
+                stopped.add(pid)
+        return len(stopped)
+
+    def running(self):
+        """PIDs of processes this manager started that are still alive, by app name."""
+        with self.lock:
+            for name in list(self.started):
+                self.started[name] = [p for p in self.started[name] if p.poll() is None]
+                if not self.started[name]:
+                    del self.started[name]
+            return {name: [p.pid for p in processes] for name, processes in self.started.items()}
+
+    def open_url(self, url):
+        self.backend.open_url(url)
+
+    def lock_pc(self):
+        self.backend.lock()
+
+    def shutdown(self, restart=False):
+        self.backend.shutdown(restart)
+
+def app_commands(manager):
+    """COMMANDS entries for opening and closing every app the manager knows."""
+    commands = {}
+    for name in manager.apps:
+        commands[("open", name)] = lambda command, name=name: manager.open(name)
+        commands[("close", name)] = lambda command, name=name: manager.close(name)
+    return commands
+
+def benchmark(rounds=20):
+    """Time from command to launched process: os.system through a shell versus the process manager."""
+    if sys.platform == "win32":
+        shell_command, app = "start /b timeout /t 5 /nobreak >nul", App(launch=["timeout", "/t", "5", "/nobreak"], image="timeout.exe")
+    else:
+        shell_command, app = "sleep 5 &", App(launch=["sleep", "5"], image="sleep")
+    manager = ProcessManager({"bench": app})
+    existing = set(manager.backend.find_pids(app.image))  # Never touch processes that were already running
+
+    timings = {"os.system": [], "ProcessManager": []}
+    for _ in range(rounds):
+        start = time.perf_counter()
+        os.system(shell_command)
+        timings["os.system"].append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        manager.open("bench")
+        timings["ProcessManager"].append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with manager.lock:
+        tracked = manager.started.pop("bench", [])
+    for process in tracked:
+        process.terminate()
+    for process in tracked:
+        process.wait()
+    close_ms = (time.perf_counter() - start) * 1000
+    # The os.system children aren't ours to track, so find them as new processes with the same image
+    spawned = set(manager.backend.find_pids(app.image)) - existing - {process.pid for process in tracked}
+    for pid in spawned:
+        manager.backend.kill(pid)
+    for name, values in timings.items():
+        values.sort()
+        print(f"{name:<15} median {values[len(values) // 2]:.2f} ms, max {values[-1]:.2f} ms to launch")
+    print(f"Closed {len(tracked)} processes in {close_ms:.1f} ms, ended {len(spawned)} os.system children")
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+
+class QueueTracker:
+    """Tracks queued by us, keyed by URI, with O(1) membership checks.
+
+    Holds at most `maxsize` tracks; the oldest are forgotten first. Safe to use
+    from the dispatcher's worker threads.
+    """
+
+    def __init__(self, maxsize=200):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.tracks = OrderedDict()  # uri -> name
+
+    def add(self, uri, name=""):
+        with self.lock:
+            self.tracks[uri] = name
+            self.tracks.move_to_end(uri)
+            while len(self.tracks) > self.maxsize:
+                self.tracks.popitem(last=False)
+
+    def discard(self, uri):
+        with self.lock:
+            self.tracks.pop(uri, None)
+
+    def clear(self):
+        with self.lock:
+            self.tracks.clear()
+
+    def __contains__(self, uri):
+        return uri in self.tracks
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def skips_needed(self, snapshot):
+        """Return how many skips clear our tracks out of one get_queue() snapshot.
+
+        Skipping can only advance from the front, so everything up to and
+        including our last queued track has to go, plus the track playing now.
+        If none of ours are queued, skip only if the current track is ours.
+        """
+        if not snapshot:
+            return 0
+        with self.lock:
+            last = -1
+            for i, item in enumerate(snapshot.get("queue") or []):
+                if item and item.get("uri") in self.tracks:
+                    last = i
+            if last >= 0:
+                return last + 2
+            current = snapshot.get("currently_playing")
+            return 1 if current and current.get("uri") in self.tracks else 0
+
+def benchmark(queue_sizes=(100, 300, 800), tracked=200, rounds=50):
+    """Compare the old name-list scan with URI reconciliation."""
+    for size in queue_sizes:
+        queue = [{"uri": f"spotify:track:{i}", "name": f"Track {i}"} for i in range(size)]
+        ours = queue[1:tracked + 1]  # Our tracks sit at the front of the user queue
+        snapshot = {"currently_playing": queue[0], "queue": queue[1:]}
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            skips = 0
+            for item in snapshot["queue"]:
+                if item["name"] in [t['name'] for t in ours]:
+                    skips += 1
+        old_ms = (time.perf_counter() - start) / rounds * 1000
+
+        tracker = QueueTracker(maxsize=tracked)
+        for track in ours:
+            tracker.add(track["uri"], track["name"])
+        start = time.perf_counter()
+        for _ in range(rounds):
+            tracker.skips_needed(snapshot)
+        new_ms = (time.perf_counter() - start) / rounds * 1000
+
+        print(f"Queue of {size}: name scan {old_ms:.3f} ms ({skips + 1} skips), "
+              f"URI reconcile {new_ms:.3f} ms ({tracker.skips_needed(snapshot)} skips)")
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,112 @@
+import json
+import os
+
+import speech_recognition as sr
+from dotenv import load_dotenv
+load_dotenv()
+
+# Commands whose words after the keywords are free text the grammar can't cover
+FREE_TEXT_SLOTS = [("google",), ("question",), ("spotify", "play")]
+
+SAMPLE_RATE = 16000
+
+def build_grammar(commands):
+    """Phrases an offline engine may decode: every COMMANDS keyword tuple plus [unk]."""
+    phrases = {" ".join(keywords) for keywords in commands}
+    phrases.update(" ".join(slot) for slot in FREE_TEXT_SLOTS)
+    return sorted(phrases) + ["[unk]"]
+
+def needs_free_text(text):
+    words = text.split()
+    return any(words[:len(slot)] == list(slot) for slot in FREE_TEXT_SLOTS)
+
+class GoogleBackend:
+    """Cloud recognition through the Google Web Speech API."""
+    name = "google"
+
+    def recognize(self, recognizer, audio):
+        return recognizer.recognize_google(audio)
+
+class VoskBackend:
+    """Offline Kaldi recognition with vosk, constrained to a command grammar.
+
+    Only phrases from the grammar (or [unk]) can come back, which keeps
+    decoding fast and stops near-misses from turning into random words.
+    """
+    name = "vosk"
+
+    def __init__(self, model_path, commands):
+        from vosk import Model, SetLogLevel  # Optional dependency: pip install vosk
+        SetLogLevel(-1)
+        self.model = Model(model_path)
+        self.grammar = json.dumps(build_grammar(commands))
+
+    def recognize(self, recognizer, audio):
+        from vosk import KaldiRecognizer
+        decoder = KaldiRecognizer(self.model, SAMPLE_RATE, self.grammar)
+        decoder.AcceptWaveform(audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=2))
+        text = json.loads(decoder.FinalResult()).get("text", "")
+        text = " ".join(word for word in text.split() if word != "[unk]")
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+class HybridBackend:
+    """Decode locally first and only go to the cloud for free text or misses."""
+    name = "hybrid"
+
+    def __init__(self, local, cloud):
+        self.local = local
+        self.cloud = cloud
+
+    def recognize(self, recognizer, audio):
+        try:
+            text = self.local.recognize(recognizer, audio)
+            if not needs_free_text(text):
+                return text
+        except sr.UnknownValueError:
+            pass
+        return self.cloud.recognize(recognizer, audio)
+
+def make_backend(commands, name=None, model_path=None, fallback=True):
+    """Build the backend named by GARMIN_RECOGNIZER (google, vosk or hybrid).
+
+    If vosk can't be loaded this falls back to google, unless fallback is
+    False, in which case the error is raised.
+    """
+    name = (name or os.getenv("GARMIN_RECOGNIZER", "google")).lower()
+    model_path = model_path or os.getenv("VOSK_MODEL_PATH", "vosk-model")
+    if name == "google":
+        return GoogleBackend()
+    if name not in ("vosk", "hybrid"):
+        if not fallback:
+            raise ValueError(f"Unknown recognizer '{name}'")
+        print(f"Unknown recognizer '{name}', using google")
+        return GoogleBackend()
+    try:
+        local = VoskBackend(model_path, commands)
+    except ImportError:
+        print("vosk library not found. Install with: pip install vosk")
+        if not fallback:
+            raise
+        print("Falling back to google recognition")
+        return GoogleBackend()
+    except Exception as e:
+        print(f"Failed to load vosk model from {model_path}: {e}")
+        if not fallback:
+            raise
+        print("Falling back to google recognition")
+        return GoogleBackend()
+    if name == "vosk":
+        return local
+    return HybridBackend(local, GoogleBackend())
+
+def transcribe_file(backend, wav_path, recognizer=None):
+    """Recognize a WAV file, e.g. a test fixture; returns None if nothing was understood."""
+    recognizer = recognizer or sr.Recognizer()
+    with sr.AudioFile(wav_path) as source:
+        audio = recognizer.record(source)
+    try:
+        return backend.recognize(recognizer, audio).lower()
+    except sr.UnknownValueError:
+        return None
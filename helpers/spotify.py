@@ -1,72 +1,74 @@
 import os
 import time
-import ctypes
-from ctypes import wintypes
 
-import requests
 import random
 from dotenv import load_dotenv
 load_dotenv()
 
-# VIRTUAL KEY CODES
-VK_MEDIA_PLAY_PAUSE = 0xB3
-VK_MEDIA_NEXT_TRACK = 0xB0
-VK_MEDIA_PREV_TRACK = 0xB1
-VK_VOLUME_UP = 0xAF
-VK_VOLUME_DOWN = 0xAE
-VK_VOLUME_MUTE = 0xAD
-
-KEYEVENTF_KEYUP = 0x0002
-
-def send_key(vk_code):
-    try:
-        user32 = ctypes.windll.user32
-        user32.keybd_event(vk_code, 0, 0, 0)
-        time.sleep(0.05)
-        user32.keybd_event(vk_code, 0, KEYEVENTF_KEYUP, 0)
-        return True
-    except Exception as e:
-        print(f"Error sending key: {e}")
-        return False
+# Import OAuth helper for user-specific operations
+try:
+    from .spotify_oauth import USER_TOKEN, get_valid_access_token
+    from .tokens import TokenCache
+    from . import http_client
+    from .cache import LRUCache, normalize_query
+    from .queue_tracker import QueueTracker
+    from .media_keys import MediaKeyQueue
+    from .player_state import PlayerState
+    from .tracing import traced
+except ImportError:
+    from spotify_oauth import USER_TOKEN, get_valid_access_token
+    from tokens import TokenCache
+    import http_client
+    from cache import LRUCache, normalize_query
+    from queue_tracker import QueueTracker
+    from media_keys import MediaKeyQueue
+    from player_state import PlayerState
+    from tracing import traced
+OAUTH_AVAILABLE = True
+
+# MEDIA KEYS: pressed on a worker thread that batches and coalesces them, see helpers/media_keys.py
+MEDIA_KEYS = MediaKeyQueue()
 
 def play_pause():
-    send_key(VK_MEDIA_PLAY_PAUSE)
+    MEDIA_KEYS.press("play_pause")
+    PLAYER.invalidate()  # Can't tell what the key did, so read the player again and poll fast
 
 def next_track():
-    send_key(VK_MEDIA_NEXT_TRACK)
+    MEDIA_KEYS.press("next")
+    PLAYER.invalidate()
 
 def previous_track():
-    send_key(VK_MEDIA_PREV_TRACK)
+    MEDIA_KEYS.press("previous")
+    PLAYER.invalidate()
 
 def volume_up():
-    for i in range(5):
-        send_key(VK_VOLUME_UP)
+    MEDIA_KEYS.press("volume_up", 5)
 
 def volume_down():
-    for i in range(5):
-        send_key(VK_VOLUME_DOWN)
+    MEDIA_KEYS.press("volume_down", 5)
 
 def mute():
-    send_key(VK_VOLUME_MUTE)
-    
+    MEDIA_KEYS.press("mute")
+
 # SPOTIFY WEB API
 CLIENT_ID = os.getenv("SPOTIFY_API_KEY")  
 CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")  
 
-QUEUED_TRACKS = []
+QUEUED_TRACKS = QueueTracker(maxsize=200)  # Tracks we queued, by URI
 
-# Import OAuth helper for user-specific operations
-try:
-    from .spotify_oauth import get_valid_access_token
-except ImportError:
-    from spotify_oauth import get_valid_access_token
-OAUTH_AVAILABLE = True
+# SEARCH CACHE, kept next to spotify_tokens.txt so restarts start warm
+SEARCH_CACHE = LRUCache(
+    maxsize=512,
+    ttl=7 * 24 * 3600,
+    path=os.path.join(os.path.dirname(__file__), '..', 'spotify_cache.json'),
+)
+TOP_TRACKS_TTL = 24 * 3600  # Top tracks change more often than search results
 
-def get_access_token():
-    if not CLIENT_ID or not CLIENT_SECRET:
-        print("Missing Spotify credentials. Add SPOTIFY_CLIENT_SECRET to .env file.")
-        return None
-    
+def cache_stats():
+    return SEARCH_CACHE.stats()
+
+@traced("spotify.fetch_client_token")
+def fetch_client_token():
     url = "https://accounts.spotify.com/api/token"
     headers = {
         "Content-Type": "application/x-www-form-urlencoded"
@@ -77,15 +79,22 @@ def get_access_token():
         "client_secret": CLIENT_SECRET
     }
     
-    response = requests.post(url, headers=headers, data=data)
+    response = http_client.post(url, headers=headers, data=data)
     
     if response.status_code == 200:
-        token_data = response.json()
-        return token_data.get("access_token")
+        return response.json()
     else:
         print(f"Failed to get access token: {response.status_code}")
         return None
 
+CLIENT_TOKEN = TokenCache(fetch_client_token, name="client credentials")
+
+def get_access_token():
+    if not CLIENT_ID or not CLIENT_SECRET:
+        print("Missing Spotify credentials. Add SPOTIFY_CLIENT_SECRET to .env file.")
+        return None
+    return CLIENT_TOKEN.get()
+
 def get_headers(user_specific=False):
     if user_specific and OAUTH_AVAILABLE:
         try:
@@ -101,7 +110,31 @@ def get_headers(user_specific=False):
         return {"Authorization": f"Bearer {token}"}
     return None
 
+def renew_headers(headers):
+    """After a 401, swap the rejected token in headers for a renewed one; False if that isn't possible."""
+    rejected = (headers or {}).get("Authorization", "").removeprefix("Bearer ")
+    for cache in (USER_TOKEN, CLIENT_TOKEN):
+        if cache.token == rejected:
+            token = cache.renew(rejected)
+            if token:
+                headers["Authorization"] = f"Bearer {token}"  # In place, so later calls with these headers use it too
+                return True
+    return False
+
+def api_request(method, url, headers=None, **kwargs):
+    """Web API request that renews an expired or revoked token and retries once on 401."""
+    response = http_client.CLIENT.request(method, url, headers=headers, **kwargs)
+    if response.status_code == 401 and renew_headers(headers):
+        response = http_client.CLIENT.request(method, url, headers=headers, **kwargs)
+    return response
+
+@traced("spotify.find_artist")
 def find_artist(artist_name):
+    cache_key = f"artist:{normalize_query(artist_name)}"
+    artist = SEARCH_CACHE.get(cache_key)
+    if artist:
+        return artist
+
     headers = get_headers()
     if not headers:
         print("Failed to get Spotify access token")
@@ -112,13 +145,55 @@ def find_artist(artist_name):
         "q": artist_name,
         "type": "artist"
     }
-    response = requests.get(url, headers=headers, params=params)
+    response = api_request("GET", url, headers=headers, params=params)
     if response.status_code == 200:
         data = response.json()
         print(f"Searching for artist: {artist_name}")
         artists = data.get("artists", {}).get("items", [])
         if artists:
-            return artists[0]  # Return the first artist found
+            artist = {key: artists[0].get(key) for key in ("id", "name", "uri")}  # Return the first artist found
+            SEARCH_CACHE.set(cache_key, artist)
+            return artist
+    return None
+
+@traced("spotify.get_top_tracks")
+def get_top_tracks(artist_id, headers):
+    cache_key = f"top-tracks:{artist_id}"
+    tracks = SEARCH_CACHE.get(cache_key)
+    if tracks:
+        return tracks
+
+    url = f"https://api.spotify.com/v1/artists/{artist_id}/top-tracks?market=US"
+    response = api_request("GET", url, headers=headers)
+    if response.status_code == 200:
+        tracks = [{"uri": t["uri"], "name": t["name"]} for t in response.json().get("tracks", [])]
+        SEARCH_CACHE.set(cache_key, tracks, ttl=TOP_TRACKS_TTL)
+        return tracks
+    print(f"Error fetching top tracks: {response.status_code}")
+    return []
+
+@traced("spotify.find_track")
+def find_track(artist_name, song_name, headers):
+    cache_key = f"track:{normalize_query(song_name)}|{normalize_query(artist_name)}"
+    track = SEARCH_CACHE.get(cache_key)
+    if track:
+        return track
+
+    url = f"https://api.spotify.com/v1/search"
+    data = {
+        "q": f"track:{song_name} artist:{artist_name}",
+        "type": "track"
+    }
+    print(f"Searching for song: {song_name} by {artist_name}")
+    response = api_request("GET", url, headers=headers, params=data)
+    if response.status_code == 200:
+        tracks = response.json().get("tracks", {}).get("items", [])
+        if tracks:
+            track = {"uri": tracks[0]["uri"], "name": tracks[0]["name"]}
+            SEARCH_CACHE.set(cache_key, track)
+            return track
+    else:
+        print(f"Error searching for track: {response.status_code}")
     return None
 
 def play_artist(artist_name):
@@ -135,110 +210,192 @@ def play_artist(artist_name):
     artist = find_artist(artist_name)
     
     if artist:
-        url = f"https://api.spotify.com/v1/artists/{artist['id']}/top-tracks?market=US"
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            tracks = response.json().get("tracks", [])
+        tracks = get_top_tracks(artist['id'], headers)
+        if tracks:
             queue_tracks(tracks)
     else:
         print(f"Artist '{artist_name}' not found")
         
-def play_artist_song(artist_name, song_name):
+def play_artist_song(artist_name, song_name, retry=True):
     headers = get_headers(user_specific=True)
     if not headers:
         print("Failed to get Spotify access token")
         return
     artist = find_artist(artist_name)
     if artist:
-        url = f"https://api.spotify.com/v1/search"
-        data = {
-            "q": f"track:{song_name} artist:{artist_name}",
-            "type": "track"
-        }
-        print(f"Searching for song: {song_name} by {artist_name}")
-        response = requests.get(url, headers=headers, params=data)
-        if response.status_code == 200:
-            tracks = response.json().get("tracks", {}).get("items", [])
-            if tracks:
-                track_uri = tracks[0]['uri']
-                play_url = "https://api.spotify.com/v1/me/player/queue"
-                params = {
-                    "uri": track_uri
-                }
-                play_response = requests.post(play_url, headers=headers, params=params)
-                if play_response.status_code == 200:
-                    print(f"Playing '{song_name}' by {artist_name}")
-                elif play_response.status_code == 404:
-                    print("No active Spotify device found. Please start Spotify and begin playing something first.")
-                    play_pause_api()
-                    play_artist_song(artist_name, song_name)
-                elif play_response.status_code == 401:
-                    print("Authorization failed. You may need to re-authorize the app.")
-                else:
-                    print(f"Failed to start playback: {play_response.status_code}")
+        track = find_track(artist_name, song_name, headers)
+        if track:
+            track_uri = track['uri']
+            play_url = "https://api.spotify.com/v1/me/player/queue"
+            params = {
+                "uri": track_uri
+            }
+            play_response = api_request("POST", play_url, headers=headers, params=params)
+            if play_response.status_code == 200:
+                print(f"Playing '{song_name}' by {artist_name}")
+                PLAYER.apply_queued([track])
+            elif play_response.status_code == 404:
+                print("No active Spotify device found. Please start Spotify and begin playing something first.")
+                PLAYER.apply_no_device()
+                play_pause_api()
+                if retry:
+                    play_artist_song(artist_name, song_name, retry=False)
+            elif play_response.status_code == 401:
+                print("Authorization failed. You may need to re-authorize the app.")
             else:
-                print(f"No tracks found for '{song_name}' by {artist_name}")
+                print(f"Failed to start playback: {play_response.status_code}")
         else:
-            print(f"Error searching for track: {response.status_code}")
+            print(f"No tracks found for '{song_name}' by {artist_name}")
+
+@traced("spotify.queue_uris")
+def queue_uris(tracks, headers):
+    """Add tracks to the player queue in order and report the result per track.
+
+    Spotify appends to the queue in the order requests arrive, so these are
+    sent one after another over the shared keep-alive connection rather than
+    in parallel. Stops early if there's no active device, since the rest would
+    fail the same way.
+    """
+    queue_url = "https://api.spotify.com/v1/me/player/queue"
+    results = []
+    for i, track in enumerate(tracks):
+        try:
+            status = api_request("POST", queue_url, headers=headers, params={"uri": track['uri']}).status_code
+        except Exception as e:
+            print(f"Error queueing '{track['name']}': {e}")
+            status = None
+        results.append({"uri": track['uri'], "name": track['name'], "status": status, "ok": status in (200, 204)})
+        if status == 404:
+            results.extend({"uri": t['uri'], "name": t['name'], "status": 404, "ok": False} for t in tracks[i + 1:])
+            break
+    return results
+
+@traced("spotify.skip_tracks")
+def skip_tracks(count, headers):
+    """Skip `count` tracks one after another over the kept-alive session.
+
+    Concurrent skips can land out of order or be merged by Spotify even though
+    each one answers 204, so they're sent in sequence, stopping at the first
+    failure. Returns the status code of each skip sent.
+    """
+    skip_url = "https://api.spotify.com/v1/me/player/next"
+    statuses = []
+    for _ in range(max(0, count)):
+        try:
+            status = api_request("POST", skip_url, headers=headers).status_code
+        except Exception as e:
+            print(f"Error skipping track: {e}")
+            status = None
+        statuses.append(status)
+        if status not in (200, 204):
+            print(f"Failed to skip track {len(statuses)} of {count}: {status}")
+            break
+    return statuses
 
-def queue_tracks(tracks):
-    global QUEUED_TRACKS
+def confirm_playing(uri, attempts=3, delay=0.3):
+    """Re-read the queue until uri is the current track; the mirror keeps the fresh read either way."""
+    for attempt in range(attempts):
+        if attempt:
+            time.sleep(delay)  # The player can take a moment to reflect the last skip
+        queue = PLAYER.get_queue(max_age=0)
+        if ((queue or {}).get("currently_playing") or {}).get("uri") == uri:
+            return True
+    return False
+
+def queue_tracks(tracks, batch_size=5):
     headers = get_headers(user_specific=True)
     if not headers:
         print("Failed to get Spotify access token")
-        return
+        return []
+    if PLAYER.device_active() is False:
+        print("No active Spotify device found. Please start Spotify and begin playing something first.")
+        return []
 
-    for track in random.sample(tracks, min(5, len(tracks))):
-        track_uri = track['uri']
-        queue_url = "https://api.spotify.com/v1/me/player/queue"
-        params = {
-            "uri": track_uri
-        }
-        queue_response = requests.post(queue_url, headers=headers, params=params)
-        if queue_response.status_code == 200:
-            print(f"Queued '{track['name']}'")
-            QUEUED_TRACKS.append(track)
+    results = queue_uris(random.sample(tracks, min(batch_size, len(tracks))), headers)
+    for result in results:
+        if result["ok"]:
+            print(f"Queued '{result['name']}'")
         else:
-            print(f"{queue_response.status_code}")
+            print(f"Failed to queue '{result['name']}': {result['status']}")
+    for result in results:
+        if result["ok"]:
+            QUEUED_TRACKS.add(result["uri"], result["name"])
+    PLAYER.apply_queued([result for result in results if result["ok"]])
+    if any(result["status"] == 404 for result in results):
+        PLAYER.apply_no_device()
+    return results
 
 def clear_queue():
-    global QUEUED_TRACKS
-    
     headers = get_headers(user_specific=True)
     if not headers:
         print("Failed to get Spotify access token")
         return
     
-    queue = get_queue()
+    # Skip counts come from queue positions, so accept less staleness than other reads
+    queue = get_queue(max_age=CLEAR_QUEUE_MAX_AGE)
+    if queue is None:
+        print("Failed to fetch the Spotify queue")
+        return
 
-    for item in queue.get("queue", []):
-        if item["name"] in [t['name'] for t in QUEUED_TRACKS]:
-            skip_current_track()
-            
+    statuses = skip_tracks(QUEUED_TRACKS.skips_needed(queue), headers)
+    skipped = sum(status in (200, 204) for status in statuses)
+    if skipped:
+        # A 204 only means the skip was accepted, so check the player ended up on the expected track
+        upcoming = queue.get("queue") or []
+        expected = upcoming[skipped - 1] if skipped <= len(upcoming) else None
+        if not (expected and expected.get("uri")):
+            PLAYER.invalidate()  # Skipped past what the snapshot showed
+        elif not confirm_playing(expected["uri"]):
+            print(f"Spotify accepted {skipped} skips but isn't playing '{expected.get('name', expected['uri'])}' yet")
     QUEUED_TRACKS.clear()
-    skip_current_track()
     return
 
-def get_queue():
+@traced("spotify.fetch_queue")
+def fetch_queue():
     headers = get_headers(user_specific=True)
     if not headers:
         print("Failed to get Spotify access token")
         return
     queue_url = "https://api.spotify.com/v1/me/player/queue"
-    response = requests.get(queue_url, headers=headers)
+    response = api_request("GET", queue_url, headers=headers)
     if response.status_code == 200:
         return response.json()
     return None
 
-def skip_current_track():
+@traced("spotify.fetch_player")
+def fetch_player():
     headers = get_headers(user_specific=True)
+    if not headers:
+        return None
+    response = api_request("GET", "https://api.spotify.com/v1/me/player", headers=headers)
+    if response.status_code == 200:
+        return response.json()
+    if response.status_code == 204:
+        return {}  # No active device
+    return None
+
+# PLAYER STATE: commands read this mirror instead of asking the Web API each time, see helpers/player_state.py
+PLAYER = PlayerState(fetch_player, fetch_queue, autostart=True)
+PLAYER_MAX_AGE = 5.0        # Seconds of staleness most reads accept
+CLEAR_QUEUE_MAX_AGE = 1.0
+
+def get_queue(max_age=PLAYER_MAX_AGE):
+    """Queue snapshot from the player mirror; max_age=0 forces a fresh read."""
+    return PLAYER.get_queue(max_age)
+
+def player_stats():
+    return PLAYER.stats()
+
+def skip_current_track(headers=None):
+    headers = headers or get_headers(user_specific=True)
     if not headers:
         print("Failed to get Spotify access token")
         return
 
     skip_url = "https://api.spotify.com/v1/me/player/next"
-    response = requests.post(skip_url, headers=headers)
-    if response.status_code == 200:
+    response = api_request("POST", skip_url, headers=headers)
+    if response.status_code in (200, 204):
+        PLAYER.apply_skip(1)
         return 0
     else:
         print(f"Failed to skip track: {response.status_code}")
@@ -248,25 +405,32 @@ def test_queue():
     print(json["queue"])
     print(len(json["queue"]))
 
+@traced("spotify.play_pause_api")
 def play_pause_api():
     headers = get_headers(user_specific=True)
     if not headers:
         print("Failed to get user access token")
         return
 
-    play_url = "https://api.spotify.com/v1/me/player/play"
-    response = requests.put(play_url, headers=headers)
-    if response.status_code == 204:
-        print("Playback paused")
+    # The mirror says which way to toggle; an unknown state tries to start playback
+    playing = PLAYER.is_playing(max_age=PLAYER_MAX_AGE)
+    play_url = f"https://api.spotify.com/v1/me/player/{'pause' if playing else 'play'}"
+    response = api_request("PUT", play_url, headers=headers)
+    if response.status_code in (200, 204):
+        PLAYER.apply_playing(not playing)
+        print("Playback paused" if playing else "Playback started")
+    elif response.status_code == 404:
+        PLAYER.apply_no_device()
+        print("No active Spotify device found")
     else:
-        print(f"Failed to pause playback: {response.status_code}")
+        print(f"Failed to {'pause' if playing else 'start'} playback: {response.status_code}")
 
 def user_profile():
     headers = get_headers(user_specific=True)
     if not headers:
         print("No user authorization. Falling back to media key...")
         return
-    user_info = requests.get("https://api.spotify.com/v1/me", headers=headers)
+    user_info = api_request("GET", "https://api.spotify.com/v1/me", headers=headers)
     if user_info.status_code == 200:
         print(user_info.json())
         return user_info.json()
@@ -4,7 +4,6 @@ import urllib.parse
 import base64
 import hashlib
 import secrets
-import requests
 import ssl
 import tempfile
 import ipaddress
@@ -13,6 +12,15 @@ import threading
 import time
 from dotenv import load_dotenv
 
+try:
+    from .tokens import TokenCache
+    from . import http_client
+    from .tracing import traced
+except ImportError:
+    from tokens import TokenCache
+    import http_client
+    from tracing import traced
+
 load_dotenv()
 
 CLIENT_ID = os.getenv("SPOTIFY_API_KEY")
@@ -202,7 +210,7 @@ def exchange_code_for_tokens(auth_code, code_verifier):
     }
     
     try:
-        response = requests.post(token_url, data=data)
+        response = http_client.post(token_url, data=data)
         
         if response.status_code == 200:
             token_data = response.json()
@@ -222,6 +230,7 @@ def save_tokens(token_data):
             f.write(f"refresh_token={token_data.get('refresh_token', '')}\n")
             f.write(f"expires_in={token_data.get('expires_in', '')}\n")
             f.write(f"token_type={token_data.get('token_type', '')}\n")
+            f.write(f"obtained_at={token_data.get('obtained_at', time.time())}\n")
     except Exception as e:
         raise
 
@@ -241,7 +250,7 @@ def load_tokens():
     except Exception as e:
         return None
 
-def refresh_access_token(refresh_token):
+def refresh_token_data(refresh_token):
     token_url = "https://accounts.spotify.com/api/token"
     
     data = {
@@ -251,10 +260,11 @@ def refresh_access_token(refresh_token):
     }
     
     try:
-        response = requests.post(token_url, data=data)
+        response = http_client.post(token_url, data=data)
         
         if response.status_code == 200:
             token_data = response.json()
+            token_data['obtained_at'] = time.time()
           
             existing_tokens = load_tokens()
             if existing_tokens:
@@ -265,10 +275,12 @@ def refresh_access_token(refresh_token):
                     existing_tokens['expires_in'] = token_data['expires_in']
                 if 'token_type' in token_data:
                     existing_tokens['token_type'] = token_data['token_type']
+                existing_tokens['obtained_at'] = token_data['obtained_at']
                 save_tokens(existing_tokens)
+                return existing_tokens
             else:
                 save_tokens(token_data)
-            return token_data.get('access_token')
+            return token_data
         else:
             print(f"Token refresh failed: {response.status_code}")
             return None
@@ -276,20 +288,45 @@ def refresh_access_token(refresh_token):
         print(f"Error during token refresh: {e}")
         return None
 
-def get_valid_access_token():
+def refresh_access_token(refresh_token):
+    token_data = refresh_token_data(refresh_token)
+    if token_data:
+        return token_data.get('access_token')
+    return None
+
+def refresh_user_token():
+    tokens = load_tokens()
+    if not tokens:
+        return None
+    return refresh_token_data(tokens['refresh_token'])
+
+@traced("spotify.fetch_user_token")
+def fetch_user_token():
     tokens = load_tokens()
     
     if not tokens:
-        token_data = get_user_authorization()
-        return token_data['access_token']
+        return get_user_authorization()
+    
+    # Reuse the saved access token while it's still good (e.g. after a restart)
+    try:
+        expires_at = float(tokens.get('obtained_at') or 0) + int(tokens.get('expires_in') or 0)
+    except ValueError:
+        expires_at = 0
+    if tokens.get('access_token') and time.time() < expires_at - USER_TOKEN.margin:
+        return tokens
     
-    access_token = refresh_access_token(tokens['refresh_token'])
+    token_data = refresh_token_data(tokens['refresh_token'])
     
-    if not access_token:
-        token_data = get_user_authorization()
-        return token_data['access_token']
+    if not token_data:
+        return get_user_authorization()
     
-    return access_token
+    return token_data
+
+# Refreshes in the background shortly before expiry; never opens the browser from there
+USER_TOKEN = TokenCache(fetch_user_token, refresh_user_token, name="user")
+
+def get_valid_access_token():
+    return USER_TOKEN.get()
 
 if __name__ == "__main__":
     try:
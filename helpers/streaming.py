@@ -0,0 +1,132 @@
+import array
+import json
+import math
+import threading
+import time
+import wave
+
+try:
+    from .recognition import SAMPLE_RATE, build_grammar, needs_free_text
+except ImportError:
+    from recognition import SAMPLE_RATE, build_grammar, needs_free_text
+
+CHUNK_MS = 20
+
+class StreamingCommandListener:
+    """Runs commands from vosk partial hypotheses instead of waiting for the phrase to end.
+
+    Feed it 16 kHz 16-bit mono chunks. A command fires on the first partial
+    that matches it unambiguously (see CommandMatcher.match_unambiguous); when
+    the final transcript arrives it is passed to on_final only if it didn't
+    already fire, so nothing runs twice. Free-text commands always wait for the
+    final transcript and get the utterance audio with it for cloud recognition.
+    """
+
+    def __init__(self, model, commands, matcher, on_command, on_final):
+        from vosk import KaldiRecognizer  # Optional dependency: pip install vosk
+        self.decoder = KaldiRecognizer(model, SAMPLE_RATE, json.dumps(build_grammar(commands)))
+        self.matcher = matcher
+        self.on_command = on_command
+        self.on_final = on_final
+        self.fired = None        # Keywords already run for the current utterance
+        self.audio = bytearray()  # Current utterance, for free-text fallback
+
+    def feed(self, chunk):
+        self.audio.extend(chunk)
+        if self.decoder.AcceptWaveform(bytes(chunk)):
+            self.finish(json.loads(self.decoder.Result()).get("text", ""))
+        else:
+            self.check_partial(json.loads(self.decoder.PartialResult()).get("partial", ""))
+
+    def check_partial(self, text):
+        text = clean(text)
+        if self.fired or not text or needs_free_text(text):
+            return
+        match = self.matcher.match_unambiguous(text)
+        if match:
+            self.fired = match[0]
+            self.on_command(text)
+
+    def finish(self, text):
+        text = clean(text)
+        audio = bytes(self.audio)
+        fired = self.fired
+        self.fired = None
+        self.audio = bytearray()
+        if not text:
+            return
+        match = self.matcher.match(text)
+        if fired and match and match[0] == fired:
+            return
+        self.on_final(text, audio)
+
+    def flush(self):
+        self.finish(json.loads(self.decoder.FinalResult()).get("text", ""))
+
+def clean(text):
+    return " ".join(word for word in text.split() if word != "[unk]")
+
+def listen_in_background(microphone, listener):
+    """Read the microphone in a thread and feed the listener; returns a stop function."""
+    running = threading.Event()
+    running.set()
+
+    def run():
+        with microphone as source:
+            frames = int(SAMPLE_RATE * CHUNK_MS / 1000)
+            while running.is_set():
+                listener.feed(source.stream.read(frames))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+
+    def stop(wait_for_stop=True):
+        running.clear()
+        if wait_for_stop:
+            thread.join()
+    return stop
+
+def speech_onset(samples, threshold=500, frames=int(SAMPLE_RATE * CHUNK_MS / 1000)):
+    """Index of the first chunk whose RMS energy crosses threshold, in samples."""
+    for start in range(0, len(samples), frames):
+        chunk = samples[start:start + frames]
+        if chunk and math.sqrt(sum(s * s for s in chunk) / len(chunk)) > threshold:
+            return start
+    return None
+
+def replay(wav_path, model, commands, matcher, onset_threshold=500):
+    """Stream a 16 kHz mono WAV through the listener and time triggers from speech onset.
+
+    Latency is audio time from onset to the chunk that fired, plus how long
+    decoding that chunk took. Returns a list of (kind, text, latency ms).
+    """
+    with wave.open(wav_path, "rb") as wav:
+        if wav.getframerate() != SAMPLE_RATE or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise ValueError(f"{wav_path} must be 16 kHz 16-bit mono")
+        data = wav.readframes(wav.getnframes())
+    samples = array.array("h", data)
+    onset = speech_onset(samples, onset_threshold) or 0
+
+    triggers = []
+    position = 0
+    chunk_started = 0.0
+    def record(kind, text):
+        audio_ms = (position - onset) / SAMPLE_RATE * 1000
+        triggers.append((kind, text, audio_ms + (time.perf_counter() - chunk_started) * 1000))
+
+    listener = StreamingCommandListener(
+        model, commands, matcher,
+        on_command=lambda text: record("partial", text),
+        on_final=lambda text, audio: record("final", text),
+    )
+    frames = int(SAMPLE_RATE * CHUNK_MS / 1000)
+    for start in range(0, len(samples), frames):
+        position = min(start + frames, len(samples))
+        chunk_started = time.perf_counter()
+        listener.feed(samples[start:position].tobytes())
+    chunk_started = time.perf_counter()
+    listener.flush()
+
+    for kind, text, latency in triggers:
+        print(f"{kind:>7}: '{text}' fired {latency:.0f} ms after speech onset")
+    return triggers
@@ -0,0 +1,82 @@
+import threading
+import time
+
+class TokenCache:
+    """Keeps an access token in memory until shortly before it expires.
+
+    fetch() and refresh() return token data dicts as Spotify sends them
+    (access_token, expires_in and optionally obtained_at). Concurrent get()
+    calls share a single in-flight fetch, and a background timer refreshes the
+    token `margin` seconds before it expires so callers rarely wait on one.
+    """
+
+    def __init__(self, fetch, refresh=None, margin=60, name="token"):
+        self.fetch = fetch
+        self.refresh = refresh or fetch
+        self.margin = margin
+        self.name = name
+        self.lock = threading.Lock()
+        self.token = None
+        self.expires_at = 0
+        self.timer = None
+
+    def current(self):
+        """Return the cached token if it's still usable, without fetching."""
+        if self.token and time.time() < self.expires_at - 5:
+            return self.token
+        return None
+
+    def get(self):
+        token = self.current()
+        if token:
+            return token
+        with self.lock:
+            # Another caller may have fetched while we waited for the lock
+            token = self.current()
+            if token:
+                return token
+            self.store(self.fetch())
+            return self.token
+
+    def store(self, token_data):
+        if not token_data or not token_data.get("access_token"):
+            self.token = None
+            self.expires_at = 0
+            return
+        obtained_at = float(token_data.get("obtained_at") or time.time())
+        self.token = token_data["access_token"]
+        self.expires_at = obtained_at + int(token_data.get("expires_in") or 3600)
+        self.schedule_refresh()
+
+    def schedule_refresh(self):
+        if self.timer:
+            self.timer.cancel()
+        delay = max(0, self.expires_at - self.margin - time.time())
+        self.timer = threading.Timer(delay, self.background_refresh)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def background_refresh(self):
+        with self.lock:
+            try:
+                token_data = self.refresh()
+            except Exception as e:
+                print(f"Background {self.name} token refresh failed: {e}")
+                return
+            if token_data:
+                self.store(token_data)
+
+    def renew(self, rejected):
+        """Replace a token the API answered 401 to with a refreshed one; returns the new token or None."""
+        with self.lock:
+            if self.token and self.token != rejected:
+                return self.token  # Another caller already renewed it
+            if self.timer:
+                self.timer.cancel()
+            self.token = None
+            self.expires_at = 0
+            try:
+                self.store(self.refresh())
+            except Exception as e:
+                print(f"Renewing the rejected {self.name} token failed: {e}")
+            return self.token
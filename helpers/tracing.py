@@ -0,0 +1,187 @@
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Pipeline stages as (name, from mark, to mark)
+STAGES = [
+    ("capture", "audio_captured", "phrase_end"),
+    ("recognition", "phrase_end", "recognition_returned"),
+    ("matching", "recognition_returned", "command_matched"),
+    ("queue_wait", "command_matched", "action_started"),
+    ("action", "action_started", "action_finished"),
+]
+
+BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf")]
+
+current = contextvars.ContextVar("garmin_trace", default=None)
+trace_ids = itertools.count(1)
+
+class Trace:
+    """Timestamps for one utterance, from audio capture to the end of its action."""
+
+    def __init__(self):
+        self.id = next(trace_ids)
+        self.started_at = time.time()
+        self.text = None
+        self.command = None
+        self.marks = {}   # mark name -> perf_counter timestamp
+        self.spans = []   # (name, start, end) for sub-steps like Spotify calls
+        self.finished = False
+
+    def mark(self, name, at=None):
+        self.marks[name] = at if at is not None else time.perf_counter()
+
+    def to_dict(self):
+        origin = min(self.marks.values(), default=0)
+        return {
+            "id": self.id,
+            "started_at": self.started_at,
+            "text": self.text,
+            "command": self.command,
+            "marks_ms": {name: round((t - origin) * 1000, 3) for name, t in self.marks.items()},
+            "spans_ms": [(name, round((start - origin) * 1000, 3), round((end - start) * 1000, 3)) for name, start, end in self.spans],
+        }
+
+class Histogram:
+    """Cumulative bucket counts for export plus a rolling window for percentiles."""
+
+    def __init__(self, window=500):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value_ms):
+        for i, bound in enumerate(BUCKETS_MS):
+            if value_ms <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value_ms
+        self.recent.append(value_ms)
+
+    def percentile(self, p):
+        if not self.recent:
+            return None
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+class Tracer:
+    """Collects finished traces into per-stage and per-span histograms.
+
+    With jsonl_path set every finished trace is appended as one JSON line; with
+    prometheus_path set the histograms are rewritten there in Prometheus text
+    format after each trace.
+    """
+
+    def __init__(self, jsonl_path=None, prometheus_path=None):
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.lock = threading.Lock()
+        self.stages = {}  # stage name -> Histogram
+        self.spans = {}   # span name -> Histogram
+
+    def finish(self, trace):
+        with self.lock:
+            if trace.finished:
+                return
+            trace.finished = True
+            for stage, start, end in STAGES:
+                if start in trace.marks and end in trace.marks:
+                    self.stages.setdefault(stage, Histogram()).observe((trace.marks[end] - trace.marks[start]) * 1000)
+            if trace.marks:
+                total = (max(trace.marks.values()) - min(trace.marks.values())) * 1000
+                self.stages.setdefault("total", Histogram()).observe(total)
+            for name, start, end in trace.spans:
+                self.spans.setdefault(name, Histogram()).observe((end - start) * 1000)
+            self.export(trace)
+
+    def export(self, trace):
+        try:
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(trace.to_dict()) + "\n")
+            if self.prometheus_path:
+                temp_path = f"{self.prometheus_path}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    f.write(self.prometheus_text())
+                os.replace(temp_path, self.prometheus_path)
+        except OSError as e:
+            print(f"Failed to export trace: {e}")
+
+    def prometheus_text(self):
+        lines = []
+        for metric, label, histograms in (("garmin_stage_latency_ms", "stage", self.stages), ("garmin_span_latency_ms", "span", self.spans)):
+            lines.append(f"# TYPE {metric} histogram")
+            for name, histogram in sorted(histograms.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS_MS, histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else str(bound)
+                    lines.append(f'{metric}_bucket{{{label}="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{{label}="{name}"}} {histogram.sum:.3f}')
+                lines.append(f'{metric}_count{{{label}="{name}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        with self.lock:
+            return {
+                name: {"count": h.count, "p50_ms": h.percentile(50), "p95_ms": h.percentile(95)}
+                for name, h in itertools.chain(self.stages.items(), self.spans.items())
+            }
+
+    def print_summary(self):
+        for name, stats in self.summary().items():
+            print(f"- {name}: {stats['count']} samples, p50 {stats['p50_ms']:.1f} ms, p95 {stats['p95_ms']:.1f} ms")
+
+TRACER = Tracer(os.getenv("GARMIN_TRACE_JSONL"), os.getenv("GARMIN_TRACE_PROMETHEUS"))
+
+def start_trace():
+    trace = Trace()
+    current.set(trace)
+    return trace
+
+def current_trace():
+    trace = current.get()
+    if trace is None or trace.finished:
+        return None
+    return trace
+
+def mark(name, at=None):
+    trace = current_trace()
+    if trace:
+        trace.mark(name, at)
+
+def finish_trace():
+    trace = current_trace()
+    if trace:
+        TRACER.finish(trace)
+
+def discard_trace():
+    current.set(None)
+
+@contextmanager
+def span(name):
+    """Record a sub-span (e.g. a Spotify request) on the current trace, if any."""
+    trace = current_trace()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace:
+            trace.spans.append((name, start, time.perf_counter()))
+
+def traced(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,62 +1,76 @@
-
-import win32gui
-import win32con
+import re
+import shutil
 import subprocess
-import os
+import sys
+import threading
+import time
 
-def make_window_active(window_name):
-    # First, print all active windows for debugging
-    def enum_windows_callback(hwnd, windows):
-        if win32gui.IsWindowVisible(hwnd) and win32gui.IsWindowEnabled(hwnd):
-            windows.append(win32gui.GetWindowText(hwnd))
-    windows = []
-    win32gui.EnumWindows(enum_windows_callback, windows)
-    print("Active windows:")
-    for w in windows:
-        print(f"- {w}")
-    
-    hwnd = win32gui.FindWindowEx(None, None, None, window_name)
-    
-    if not hwnd:
-        def find_window_callback(hwnd, param):
-            if win32gui.IsWindowVisible(hwnd) and win32gui.IsWindowEnabled(hwnd):
-                window_title = win32gui.GetWindowText(hwnd)
-                if window_name.lower() in window_title.lower():
-                    param.append(hwnd)
-        
-        found_windows = []
-        win32gui.EnumWindows(find_window_callback, found_windows)
-        if found_windows:
-            hwnd = found_windows[0]  # Use the first match
-    
-    if hwnd:
-        window_title = win32gui.GetWindowText(hwnd)
-        print(f"Found window: {window_title}")
-        
-        try:
-            result = subprocess.run(['komorebic', 'query', 'focused-window'], 
-                                  capture_output=True, text=True, timeout=2)
-            if result.returncode == 0:
-                print("Komorebi detected, trying komorebi focus...")
-                subprocess.run(['komorebic', 'focus-window', str(hwnd)], 
-                             capture_output=True, timeout=2)
+class Win32Backend:
+    """Window enumeration and activation through pywin32."""
+
+    def __init__(self):
+        import win32gui
+        import win32con
+        self.win32gui = win32gui
+        self.win32con = win32con
+        self.manager = None
+        self.manager_checked = False
+
+    def enumerate(self):
+        """All visible, enabled top-level windows as (hwnd, title)."""
+        def callback(hwnd, windows):
+            if self.win32gui.IsWindowVisible(hwnd) and self.win32gui.IsWindowEnabled(hwnd):
+                title = self.win32gui.GetWindowText(hwnd)
+                if title:
+                    windows.append((hwnd, title))
+        windows = []
+        self.win32gui.EnumWindows(callback, windows)
+        return windows
+
+    def title(self, hwnd):
+        """Current title if hwnd is still a visible window, else None. Much cheaper than enumerating."""
+        if not self.win32gui.IsWindow(hwnd) or not self.win32gui.IsWindowVisible(hwnd):
+            return None
+        return self.win32gui.GetWindowText(hwnd)
+
+    def window_manager(self):
+        # Checked once: komorebic on PATH and answering means komorebi manages focus
+        if not self.manager_checked:
+            self.manager_checked = True
+            if shutil.which("komorebic"):
+                try:
+                    result = subprocess.run(['komorebic', 'query', 'focused-window'],
+                                            capture_output=True, text=True, timeout=2)
+                    if result.returncode == 0:
+                        print("Komorebi detected, focusing windows through komorebic")
+                        self.manager = "komorebi"
+                except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError):
+                    pass
+        return self.manager
+
+    def activate(self, hwnd, window_title):
+        if self.window_manager() == "komorebi":
+            try:
+                subprocess.run(['komorebic', 'focus-window', str(hwnd)],
+                               capture_output=True, timeout=2)
                 print(f"Focused window via Komorebi: {window_title}")
                 return
-        except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError):
-            print("Komorebi not available or failed, using standard Windows API...")
-        
+            except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError):
+                print("Komorebi focus failed, using standard Windows API...")
+
+        win32gui, win32con = self.win32gui, self.win32con
         try:
             # Simple approach that works better with tiling window managers
             win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
             win32gui.BringWindowToTop(hwnd)
-            
+
             try:
                 win32gui.SetForegroundWindow(hwnd)
             except:
                 win32gui.ShowWindow(hwnd, win32con.SW_SHOW)
-            
+
             print(f"Activated window via Windows API: {window_title}")
-            
+
         except Exception as e:
             print(f"Error activating window: {e}")
             try:
@@ -64,8 +78,181 @@ def make_window_active(window_name):
                 print(f"Made window visible (final fallback): {window_title}")
             except Exception as e2:
                 print(f"All methods failed: {e2}")
-    else:
+
+class FakeBackend:
+    """An in-memory window list for testing and benchmarking the index on any platform.
+
+    call_cost (seconds) is spent on every per-window call, to stand in for the
+    cross-process GetWindowText calls that make real enumeration slow.
+    """
+
+    def __init__(self, windows=(), call_cost=0.0):
+        self.windows = dict(windows)  # hwnd -> title
+        self.call_cost = call_cost
+        self.enumerations = 0
+        self.title_calls = 0
+        self.activated = []
+
+    def spend(self, calls):
+        deadline = time.perf_counter() + self.call_cost * calls
+        while time.perf_counter() < deadline:
+            pass
+
+    def enumerate(self):
+        self.enumerations += 1
+        self.spend(len(self.windows))
+        return list(self.windows.items())
+
+    def title(self, hwnd):
+        self.title_calls += 1
+        self.spend(1)
+        return self.windows.get(hwnd)
+
+    def window_manager(self):
+        return None
+
+    def activate(self, hwnd, window_title):
+        self.activated.append(hwnd)
+        print(f"Activated window: {window_title}")
+
+def normalize_title(title):
+    return " ".join(re.findall(r"\w+", title.lower()))
+
+class WindowIndex:
+    """Title lookups for "go to" commands without enumerating every window each time.
+
+    Titles are kept normalized (lowercase words) with a word -> hwnds index,
+    so a lookup only checks windows containing every word of the name. A hit
+    is revalidated with one cheap title read; only when no indexed window
+    still matches is the full window list enumerated again.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.titles = {}  # hwnd -> (title, normalized title)
+        self.words = {}   # word -> set of hwnds
+        self.order = {}   # hwnd -> position in the last enumeration, which is z-order (topmost first)
+        self.refreshes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _add(self, hwnd, title):
+        normalized = normalize_title(title)
+        self.titles[hwnd] = (title, normalized)
+        for word in set(normalized.split()):
+            self.words.setdefault(word, set()).add(hwnd)
+
+    def _remove(self, hwnd):
+        _, normalized = self.titles.pop(hwnd)
+        for word in set(normalized.split()):
+            hwnds = self.words.get(word)
+            if hwnds:
+                hwnds.discard(hwnd)
+                if not hwnds:
+                    del self.words[word]
+
+    def refresh(self):
+        with self.lock:
+            self.titles.clear()
+            self.words.clear()
+            self.order.clear()
+            for position, (hwnd, title) in enumerate(self.backend.enumerate()):
+                self.order[hwnd] = position
+                self._add(hwnd, title)
+            self.refreshes += 1
+
+    def candidates(self, name):
+        """Indexed windows whose title contains name, exact title matches first, then topmost first."""
+        key = normalize_title(name)
+        words = key.split()
+        if not words:
+            return []
+        hwnds = set.intersection(*(self.words.get(word, set()) for word in words))
+        matches = [hwnd for hwnd in hwnds if f" {key} " in f" {self.titles[hwnd][1]} "]
+        return sorted(matches, key=lambda hwnd: (self.titles[hwnd][1] != key, self.order[hwnd]))
+
+    def _lookup(self, name):
+        for hwnd in self.candidates(name):
+            title = self.backend.title(hwnd)
+            if title == self.titles[hwnd][0]:
+                return hwnd, title
+            # Closed or retitled since it was indexed
+            self._remove(hwnd)
+            if title:
+                self._add(hwnd, title)
+                if f" {normalize_title(name)} " in f" {normalize_title(title)} ":
+                    return hwnd, title
+        return None
+
+    def find(self, name):
+        """(hwnd, title) of a window whose title contains name, or None."""
+        with self.lock:
+            found = self._lookup(name)
+        if found:
+            self.hits += 1
+            return found
+        self.misses += 1
+        self.refresh()  # A window may have opened since the last enumeration
+        with self.lock:
+            return self._lookup(name)
+
+    def windows(self):
+        with self.lock:
+            return [title for title, _ in self.titles.values()]
+
+    def stats(self):
+        return {"windows": len(self.titles), "hits": self.hits, "misses": self.misses, "refreshes": self.refreshes}
+
+def default_backend():
+    # Only Windows has real windows to switch to; elsewhere the index stays empty
+    return Win32Backend() if sys.platform == "win32" else FakeBackend()
+
+INDEX = WindowIndex(default_backend())
+
+def make_window_active(window_name):
+    found = INDEX.find(window_name)
+    if not found:
         print(f"Window containing '{window_name}' not found.")
+        return
+    hwnd, window_title = found
+    print(f"Found window: {window_title}")
+    INDEX.backend.activate(hwnd, window_title)
+
+def print_windows():
+    INDEX.refresh()
+    print("Active windows:")
+    for title in INDEX.windows():
+        print(f"- {title}")
+
+def benchmark(n_windows=200, lookups=1000, call_cost=20e-6):
+    """Compare indexed lookups with enumerating every window per lookup, on a fake window list."""
+    apps = ["Google Chrome", "Notepad", "Visual Studio Code", "Spotify", "Discord", "Steam"]
+    windows = {hwnd: f"Document {hwnd} - {apps[hwnd % len(apps)]}" for hwnd in range(1, n_windows + 1)}
+
+    backend = FakeBackend(windows, call_cost)
+    start = time.perf_counter()
+    for i in range(lookups):
+        name = apps[i % len(apps)].lower()
+        next((hwnd for hwnd, title in backend.enumerate() if name in title.lower()), None)
+    naive = time.perf_counter() - start
+    naive_enumerations = backend.enumerations
+
+    backend = FakeBackend(windows, call_cost)
+    index = WindowIndex(backend)
+    start = time.perf_counter()
+    for i in range(lookups):
+        if i == lookups // 2:
+            backend.windows.pop(next(iter(backend.windows)))  # A window closes mid-run
+        index.find(apps[i % len(apps)])
+    indexed = time.perf_counter() - start
+
+    print(f"{n_windows} windows, {lookups} lookups, {call_cost * 1e6:.0f} us per window call")
+    print(f"Enumerate per lookup: {naive / lookups * 1e6:.1f} us per lookup, {naive_enumerations} enumerations")
+    print(f"Window index:         {indexed / lookups * 1e6:.1f} us per lookup, {backend.enumerations} enumerations, {index.stats()}")
 
 if __name__ == "__main__":
-    make_window_active("Google Chrome")
\ No newline at end of file
+    if sys.platform == "win32":
+        make_window_active("Google Chrome")
+    else:
+        benchmark()
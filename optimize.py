@@ -1,7 +1,21 @@
+import argparse
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import speech_recognition as sr
 
+PROFILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "garmin_profile.json")
+
+# Grid searched by --corpus; pause_threshold must be >= non_speaking_duration
+SEARCH_SPACE = {
+    "pause_threshold": [0.3, 0.4, 0.5, 0.6, 0.8],
+    "phrase_threshold": [0.1, 0.2, 0.3],
+    "non_speaking_duration": [0.2, 0.3, 0.5],
+}
+
 def callback(recognizer, audio):
-    global COMMAND
     try:
         command = recognizer.recognize_google(audio).lower()
         print(command)
@@ -9,70 +23,132 @@ def callback(recognizer, audio):
         pass
     except sr.RequestError as e:
         pass
-    
-# INITIALIZE RECOGNITION
-r = sr.Recognizer()
-m = sr.Microphone()
-
-# Default settings
-r.pause_threshold = 0.5
-r.phrase_threshold = 0.2
-r.non_speaking_duration = 0.5
-
-print("Adjusting for ambient noise, please be quiet...")
-with m as source:
-    r.adjust_for_ambient_noise(source)
-print("Ambient noise adjustment complete.")
-
-stop_listening = None
-
-while True:
-    print("\n--- Current Settings ---")
-    print(f"1. pause_threshold: {r.pause_threshold}")
-    print(f"2. phrase_threshold: {r.phrase_threshold}")
-    print(f"3. non_speaking_duration: {r.non_speaking_duration}")
-    print("\nListening in the background. Speak a few commands to test.")
-    
-    # Start listening in the background
-    stop_listening = r.listen_in_background(m, callback)
-    
-    # Test period
-    input("Press Enter when you are ready to provide feedback...")
-    
-    # Stop listening
-    if stop_listening:
-        stop_listening(wait_for_stop=False)
-        
-    satisfied = input("Are the settings fluid? (y/n): ").lower()
-    if satisfied == 'y':
-        print("Great! Final settings are:")
-        print(f" - pause_threshold: {r.pause_threshold}")
-        print(f" - phrase_threshold: {r.phrase_threshold}")
-        print(f" - non_speaking_duration: {r.non_speaking_duration}")
-        # To keep listening with final settings, we can start it one last time
-        print("\nNow listening with the final optimized settings...")
-        r.listen_in_background(m, callback)
-        # Keep the script running
-        import time
-        while True:
-            time.sleep(0.1)
+
+def interactive():
+    # INITIALIZE RECOGNITION
+    r = sr.Recognizer()
+    m = sr.Microphone()
+
+    # Default settings
+    r.pause_threshold = 0.5
+    r.phrase_threshold = 0.2
+    r.non_speaking_duration = 0.5
+
+    print("Adjusting for ambient noise, please be quiet...")
+    with m as source:
+        r.adjust_for_ambient_noise(source)
+    print("Ambient noise adjustment complete.")
+
+    stop_listening = None
 
     while True:
-        choice = input("Which parameter to adjust? (1, 2, 3) or 'r' to restart test: ")
-        if choice in ['1', '2', '3']:
-            try:
-                value = float(input(f"Enter new value for parameter {choice}: "))
-                if choice == '1':
-                    r.pause_threshold = value
-                elif choice == '2':
-                    r.phrase_threshold = value
-                elif choice == '3':
-                    r.non_speaking_duration = value
-                break 
-            except ValueError:
-                print("Invalid input. Please enter a number.")
-        elif choice.lower() == 'r':
-            break
-        else:
-            print("Invalid choice. Please enter 1, 2, 3, or 'r'.")
+        print("\n--- Current Settings ---")
+        print(f"1. pause_threshold: {r.pause_threshold}")
+        print(f"2. phrase_threshold: {r.phrase_threshold}")
+        print(f"3. non_speaking_duration: {r.non_speaking_duration}")
+        print("\nListening in the background. Speak a few commands to test.")
+
+        # Start listening in the background
+        stop_listening = r.listen_in_background(m, callback)
+
+        # Test period
+        input("Press Enter when you are ready to provide feedback...")
+
+        # Stop listening
+        if stop_listening:
+            stop_listening(wait_for_stop=False)
+
+        satisfied = input("Are the settings fluid? (y/n): ").lower()
+        if satisfied == 'y':
+            print("Great! Final settings are:")
+            print(f" - pause_threshold: {r.pause_threshold}")
+            print(f" - phrase_threshold: {r.phrase_threshold}")
+            print(f" - non_speaking_duration: {r.non_speaking_duration}")
+            # To keep listening with final settings, we can start it one last time
+            print("\nNow listening with the final optimized settings...")
+            r.listen_in_background(m, callback)
+            # Keep the script running
+            import time
+            while True:
+                time.sleep(0.1)
+
+        while True:
+            choice = input("Which parameter to adjust? (1, 2, 3) or 'r' to restart test: ")
+            if choice in ['1', '2', '3']:
+                try:
+                    value = float(input(f"Enter new value for parameter {choice}: "))
+                    if choice == '1':
+                        r.pause_threshold = value
+                    elif choice == '2':
+                        r.phrase_threshold = value
+                    elif choice == '3':
+                        r.non_speaking_duration = value
+                    break 
+                except ValueError:
+                    print("Invalid input. Please enter a number.")
+            elif choice.lower() == 'r':
+                break
+            else:
+                print("Invalid choice. Please enter 1, 2, 3, or 'r'.")
+
+# AUTOMATED SEARCH
+backends = {}  # Per worker process, so a vosk model loads once
+
+def evaluate(job):
+    corpus_dir, settings, backend_name = job
+    import replay
+    backend = None
+    if backend_name != "stub":
+        if backend_name not in backends:
+            from helpers import recognition
+            # No silent fallback to google: the grid would send every utterance to the cloud once per setting
+            backends[backend_name] = recognition.make_backend(replay.import_garmin().COMMANDS, name=backend_name, fallback=False)
+        backend = backends[backend_name]
+    report = replay.replay(corpus_dir, backend, settings, verbose=False)
+    return settings, report["accuracy"], report["stages"]["end_of_speech_detection"]["p95_ms"]
+
+def score(accuracy, latency_ms, latency_weight):
+    """Accuracy minus latency_weight per second of p95 end-of-speech delay."""
+    return accuracy - latency_weight * latency_ms / 1000
+
+def auto_tune(corpus_dir, backend="vosk", latency_weight=0.1, workers=None, profile_path=PROFILE_PATH):
+    """Grid search recognizer settings against a labelled corpus and save the best profile."""
+    names = list(SEARCH_SPACE)
+    candidates = [dict(zip(names, values)) for values in itertools.product(*SEARCH_SPACE.values())]
+    candidates = [c for c in candidates if c["pause_threshold"] >= c["non_speaking_duration"]]
+    print(f"Evaluating {len(candidates)} settings on {corpus_dir}...")
+
+    best = None
+    ties = []  # Other settings that scored exactly as well as best
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for settings, accuracy, latency_ms in pool.map(evaluate, [(corpus_dir, c, backend) for c in candidates]):
+            result = score(accuracy, latency_ms, latency_weight)
+            print(f"{settings}: accuracy {accuracy:.1%}, p95 latency {latency_ms:.0f} ms, score {result:.3f}")
+            if best is None or result > best[0]:
+                best = (result, settings, accuracy, latency_ms)
+                ties = []
+            elif result == best[0]:
+                ties.append(settings)
+
+    result, settings, accuracy, latency_ms = best
+    if ties:
+        print(f"{len(ties)} other settings scored the same; the corpus can't tell them apart, keeping the first")
+    profile = dict(settings, accuracy=accuracy, p95_latency_ms=latency_ms, corpus=os.path.abspath(corpus_dir))
+    with open(profile_path, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+    print(f"Best settings: {settings} (accuracy {accuracy:.1%}, p95 latency {latency_ms:.0f} ms)")
+    print(f"Saved profile to {profile_path}")
+    return profile
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune speech recognition settings for garmin")
+    parser.add_argument("--corpus", help="Labelled WAV corpus (see replay.py); without it, tune interactively")
+    parser.add_argument("--backend", default="vosk", help="vosk, hybrid, google or stub (labelled transcripts, only checks segmentation)")
+    parser.add_argument("--latency-weight", type=float, default=0.1, help="Accuracy traded per second of latency")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
 
+    if args.corpus:
+        auto_tune(args.corpus, args.backend, args.latency_weight, args.workers)
+    else:
+        interactive()
@@ -0,0 +1,297 @@
+"""Replay recorded utterances through the garmin pipeline, no microphone needed.
+
+Usage: python replay.py CORPUS_DIR [--backend stub|google|vosk|hybrid] [--streaming]
+
+CORPUS_DIR holds WAV files plus a labels.csv with the columns
+file, transcript, command, where command is the expected keyword tuple joined
+by spaces (e.g. "next song") or empty when nothing should run. Each file is
+memory-mapped, split into phrases by the same speech_recognition settings
+garmin uses, gated by the VAD, recognized and matched through garmin.callback.
+Actions are recorded instead of run, so this works headless on Linux.
+
+With --streaming each file instead goes through the vosk streaming listener
+(GARMIN_STREAMING mode), reporting how long after speech onset commands fire.
+"""
+import argparse
+import contextlib
+import csv
+import io
+import mmap
+import os
+import queue
+import sys
+import time
+import types
+import wave
+
+import numpy as np
+import speech_recognition as sr
+
+# Modules whose side effects (or Windows-only imports) the replay never needs
+STUBBED_MODULES = ["keyboard", "helpers.mistral", "helpers.avatar", "helpers.win32", "helpers.spotify"]
+
+def import_garmin():
+    for name in STUBBED_MODULES:
+        if name not in sys.modules:
+            sys.modules[name] = types.ModuleType(name)
+    import garmin
+    return garmin
+
+MIC_CHUNK = 1024  # Frames per read of sr.Microphone, which garmin listens with
+
+class StubBackend:
+    """Returns the labelled transcript for the first phrase of each file.
+
+    replay passes each file's audio and labelled speech span (in seconds) to
+    load. A phrase that cuts the speech span short only gets the words it
+    covers, so settings that split or clip utterances score worse instead of
+    always matching.
+    """
+    name = "stub"
+    tolerance = 0.05  # Seconds of the speech span a phrase may miss, about the energy chunk size
+
+    def __init__(self):
+        self.pending = None
+        self.speech = None
+        self.data = None    # Mapped WAV of the current file, to find where a phrase sits in it
+        self.layout = None
+
+    def load(self, transcript, data, speech):
+        self.pending = transcript
+        self.speech = speech
+        self.data = data
+        self.layout = pcm_layout(data)
+
+    def window(self, audio):
+        offset, n_frames, rate, width, channels = self.layout
+        if width != 2 or channels != 1 or not audio.frame_data:
+            return None
+        position = self.data.find(audio.frame_data, offset, offset + n_frames * 2)
+        if position < 0:
+            return None
+        start = (position - offset) / (2 * rate)
+        return start, start + len(audio.frame_data) / (2 * rate)
+
+    def recognize(self, recognizer, audio):
+        if not self.pending:
+            raise sr.UnknownValueError()
+        text = self.pending
+        window = self.window(audio) if self.speech else None
+        if window:
+            (start, end), (window_start, window_end) = self.speech, window
+            if window_start > start + self.tolerance or window_end < end - self.tolerance:
+                words = text.split()
+                covered = max(0.0, min(end, window_end) - max(start, window_start)) / max(end - start, 1e-6)
+                n = int(len(words) * covered)
+                if n == 0:
+                    raise sr.UnknownValueError()
+                text = " ".join(words[:n] if window_start <= start + self.tolerance else words[-n:])
+        self.pending = None
+        return text
+
+class RecordingDispatcher:
+    """Stands in for garmin.DISPATCHER: records matched commands instead of running them."""
+
+    def __init__(self, tracing):
+        self.tracing = tracing
+        self.matched = []
+
+    def submit(self, category, name, func, *args, timeout=None):
+        self.tracing.mark("action_started")
+        self.matched.append(name)
+        self.tracing.mark("action_finished")
+        self.tracing.finish_trace()
+        return True
+
+def load_corpus(corpus_dir):
+    with open(os.path.join(corpus_dir, "labels.csv"), newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+@contextlib.contextmanager
+def mapped_wav(path):
+    """Memory-map a WAV file so frames are paged in as they are read."""
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield data
+        finally:
+            data.close()
+
+def pcm_layout(data):
+    """(offset of the first frame, frame count, rate, sample width, channels) of the WAV in data."""
+    data.seek(0)
+    with wave.open(data, "rb") as wav:
+        layout = (data.tell(), wav.getnframes(), wav.getframerate(), wav.getsampwidth(), wav.getnchannels())
+    data.seek(0)
+    return layout
+
+def speech_span_seconds(data, energy_threshold, chunk_ms=20, block_chunks=500):
+    """Start of the first and end of the last chunk whose RMS energy crosses the threshold, in seconds.
+
+    Reads the mapped file a block at a time, so only one block is ever copied out of the mapping.
+    """
+    offset, n_frames, rate, width, channels = pcm_layout(data)
+    if width != 2:
+        return None
+    chunk = max(1, int(rate * chunk_ms / 1000))
+    n_chunks = n_frames // chunk
+    first = last = None
+    for block_start in range(0, n_chunks, block_chunks):
+        count = min(block_chunks, n_chunks - block_start)
+        samples = np.frombuffer(data, dtype=np.int16, count=count * chunk * channels,
+                                offset=offset + block_start * chunk * channels * 2)
+        samples = samples[::channels].astype(np.float32).reshape(count, chunk)
+        loud = np.nonzero(np.sqrt(np.mean(samples ** 2, axis=1)) > energy_threshold)[0]
+        if len(loud):
+            first = block_start + loud[0] if first is None else first
+            last = block_start + loud[-1]
+    if first is None:
+        return None
+    return first * chunk / rate, (last + 1) * chunk / rate
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def replay(corpus_dir, backend=None, settings=None, verbose=True):
+    """Run the corpus through the pipeline and return a report dict.
+
+    settings may override pause_threshold, phrase_threshold,
+    non_speaking_duration and energy_threshold on the recognizer.
+    """
+    garmin = import_garmin()
+    tracing = garmin.tracing
+    from helpers.vad import VoiceActivityGate
+
+    rows = load_corpus(corpus_dir)
+    stub = backend is None
+    backend = backend or StubBackend()
+    dispatcher = RecordingDispatcher(tracing)
+    garmin.DISPATCHER = dispatcher
+    garmin.RECOGNIZER_BACKEND = backend
+    garmin.VAD = VoiceActivityGate()
+    tracing.TRACER = tracing.Tracer()
+
+    recognizer = sr.Recognizer()
+    recognizer.dynamic_energy_threshold = False
+    for name in ("pause_threshold", "phrase_threshold", "non_speaking_duration"):
+        setattr(recognizer, name, getattr(garmin.r, name))
+    for name, value in (settings or {}).items():
+        setattr(recognizer, name, value)
+
+    audio_seconds = 0.0
+    segment_ms = []
+    detection_ms = []  # Audio time from end of speech until the matching phrase was cut
+    correct = 0
+    results = []
+    quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    started = time.perf_counter()
+    with quiet:
+        for row in rows:
+            dispatcher.matched.clear()
+            with mapped_wav(os.path.join(corpus_dir, row["file"])) as data:
+                speech = speech_span_seconds(data, recognizer.energy_threshold)
+                speech_end = speech[1] if speech else None
+                if stub:
+                    backend.load(row["transcript"].lower(), data, speech)
+                with sr.AudioFile(data) as source:
+                    source.CHUNK = MIC_CHUNK  # Same pause granularity as live capture
+                    audio_seconds += source.DURATION
+                    reader = source.audio_reader
+                    while reader.tell() < reader.getnframes():
+                        segment_start = time.perf_counter()
+                        audio = recognizer.listen(source)
+                        segment_ms.append((time.perf_counter() - segment_start) * 1000)
+                        # listen returns on the chunk that completed the pause, so this is where the phrase was cut
+                        phrase_cut = reader.tell()
+                        cut_by_pause = phrase_cut < reader.getnframes()  # Not just the end of the file
+                        if audio.frame_data:
+                            matched_before = len(dispatcher.matched)
+                            garmin.callback(recognizer, audio)
+                            if matched_before == 0 and dispatcher.matched and speech_end is not None and cut_by_pause:
+                                detection_ms.append(max(0.0, phrase_cut / reader.getframerate() - speech_end) * 1000)
+
+            # Nothing consumes avatar events during a replay
+            while True:
+                try:
+                    garmin.events.EVENTS.get_nowait()
+                except queue.Empty:
+                    break
+
+            predicted = " ".join(dispatcher.matched[0]) if dispatcher.matched else ""
+            expected = " ".join(row["command"].split())
+            correct += predicted == expected
+            results.append((row["file"], expected, predicted))
+            if predicted != expected:
+                print(f"MISS {row['file']}: expected '{expected}', got '{predicted}'")
+    elapsed = time.perf_counter() - started
+
+    stages = {name: {"p50_ms": h.percentile(50), "p95_ms": h.percentile(95), "p99_ms": h.percentile(99)}
+              for name, h in tracing.TRACER.stages.items()}
+    stages["segmentation"] = {"p50_ms": percentile(segment_ms, 50), "p95_ms": percentile(segment_ms, 95), "p99_ms": percentile(segment_ms, 99)}
+    stages["end_of_speech_detection"] = {"p50_ms": percentile(detection_ms, 50), "p95_ms": percentile(detection_ms, 95), "p99_ms": percentile(detection_ms, 99)}
+    report = {
+        "utterances": len(rows),
+        "accuracy": correct / len(rows) if rows else 0.0,
+        "elapsed_s": elapsed,
+        "utterances_per_s": len(rows) / elapsed if elapsed else 0.0,
+        "realtime_factor": audio_seconds / elapsed if elapsed else 0.0,
+        "stages": stages,
+        "vad": garmin.VAD.stats(),
+        "results": results,
+    }
+    if verbose:
+        print_report(report)
+    return report
+
+def print_report(report):
+    print(f"Utterances: {report['utterances']}  accuracy: {report['accuracy']:.1%}")
+    print(f"Throughput: {report['utterances_per_s']:.1f} utterances/s, {report['realtime_factor']:.1f}x realtime")
+    for name, stats in report["stages"].items():
+        print(f"- {name}: p50 {stats['p50_ms']:.2f} ms, p95 {stats['p95_ms']:.2f} ms, p99 {stats['p99_ms']:.2f} ms")
+    print(f"VAD: {report['vad']}")
+
+def replay_streaming(corpus_dir, model_path=None):
+    """Run each 16 kHz mono file through the streaming listener; returns a report dict."""
+    garmin = import_garmin()
+    from helpers import recognition, streaming
+    model = recognition.VoskBackend(model_path or os.getenv("VOSK_MODEL_PATH", "vosk-model"), garmin.COMMANDS).model
+
+    rows = load_corpus(corpus_dir)
+    correct = 0
+    latencies = []  # First trigger per file, ms after speech onset
+    for row in rows:
+        print(f"{row['file']}:")
+        triggers = streaming.replay(os.path.join(corpus_dir, row["file"]), model, garmin.COMMANDS, garmin.MATCHER)
+        match = garmin.MATCHER.match(triggers[0][1]) if triggers else None
+        predicted = " ".join(match[0]) if match else ""
+        correct += predicted == " ".join(row["command"].split())
+        if triggers:
+            latencies.append(triggers[0][2])
+    report = {
+        "utterances": len(rows),
+        "accuracy": correct / len(rows) if rows else 0.0,
+        "trigger_ms": {"p50_ms": percentile(latencies, 50), "p95_ms": percentile(latencies, 95), "p99_ms": percentile(latencies, 99)},
+    }
+    stats = report["trigger_ms"]
+    print(f"Utterances: {report['utterances']}  accuracy: {report['accuracy']:.1%}")
+    print(f"- trigger after onset: p50 {stats['p50_ms']:.0f} ms, p95 {stats['p95_ms']:.0f} ms, p99 {stats['p99_ms']:.0f} ms")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a WAV corpus through the garmin pipeline")
+    parser.add_argument("corpus_dir")
+    parser.add_argument("--backend", default="stub", help="stub (labelled transcripts), google, vosk or hybrid")
+    parser.add_argument("--streaming", action="store_true", help="Time commands fired from vosk partial transcripts instead")
+    args = parser.parse_args()
+
+    if args.streaming:
+        replay_streaming(args.corpus_dir)
+    else:
+        backend = None
+        if args.backend != "stub":
+            from helpers import recognition
+            backend = recognition.make_backend(import_garmin().COMMANDS, name=args.backend)
+        replay(args.corpus_dir, backend)